@@ -15,87 +15,183 @@ cl::opt<bool> BBAnalyze(
 	cl::desc("Basic Block analyze"), 
 	cl::NotHidden, cl::init(false));
 
-static void countBasicBlocks(llvm::Module &M, std::vector<std::string> &data) {
-	
+cl::opt<bool> NDJSONOutput(
+    "ndjson",
+	cl::desc("Write one JSON object per module and line ({\"Module\": ..., \"Functions\": {...}}) as modules are analyzed"),
+	cl::NotHidden, cl::init(false));
+
+cl::opt<unsigned> Jobs(
+    "j",
+	cl::desc("Number of worker threads analyzing modules (0 = number of cores)"),
+	cl::NotHidden, cl::init(1));
+
+// Result of one input file, written in input order
+struct ModuleResult {
+	bool Done = false;
+	bool Loaded = false;
+	std::string Path;
+	std::string Functions; // serialized {"function": {"BasicBlocks": N}, ...}
+};
+
+static std::string getModulePath(llvm::Module &M) {
 	std::string moduleName = M.getName().str();
 	char modulePath[PATH_MAX] = { 0 };
 	realpath(moduleName.c_str(), modulePath);
-	std::vector<std::string> tmp;
+	return modulePath;
+}
 
-	for (auto &F : M) {
-		if (F.getName().str().find("llvm.") == 0) {
-			continue;
+// Write {"function": {"BasicBlocks": N}, ...} for the functions of a module
+static void countBasicBlocks(llvm::Module &M, json::OStream &J) {
+	J.object([&] {
+		for (auto &F : M) {
+			if (F.getName().str().find("llvm.") == 0) {
+				continue;
+			}
+
+			if (F.size() == 0) {
+				// Skip functions without basic blocks
+				continue;
+			}
+
+			J.attributeObject(F.getName(), [&] {
+				J.attribute("BasicBlocks", static_cast<int64_t>(F.size()));
+			});
 		}
+	});
+}
 
-		if (F.size() == 0) {
-			// Skip functions without basic blocks
-			continue;
-		}
+static void analyzeModule(const std::string &Filename, ModuleResult &Result) {
+	// Each module gets its own context, freed as soon as the module has been counted
+	LLVMContext Ctx;
+	SMDiagnostic Err;
+	std::unique_ptr<Module> M = parseIRFile(Filename, Err, Ctx);
 
-		std::stringstream ss;
-		ss << '"'
-			<< F.getName().str() 
-			<< "\": {" 
-			<< "\"BasicBlocks\":"
-			<< F.size() 
-			<< "}";
-		tmp.push_back(ss.str());
+	if (M == NULL) {
+		return;
 	}
 
-	std::stringstream s;
-	s << "\"" << modulePath << "\": {";
-	data.push_back(s.str());
-	for (auto i = 0; i < tmp.size(); ++i) {
-		data.push_back(tmp[i]);
-		if (i < tmp.size() - 1) {
-			data.push_back(",\n");
-		}
-	}
-	data.push_back("\n}");
-	data.push_back(",\n");
+	Result.Loaded = true;
+	Result.Path = getModulePath(*M);
+	raw_string_ostream SS(Result.Functions);
+	json::OStream J(SS);
+	countBasicBlocks(*M, J);
+	SS.flush();
 }
 
-static void Write2Json(std::vector<std::string> AllData) {
-	std::ofstream os(OutputFilename);
-	if (!os) {
+static void run(const cl::list<std::string> &InputFilenames)
+{
+	std::string OutputPath = OutputFilename;
+	if (NDJSONOutput && OutputFilename.getNumOccurrences() == 0) {
+		OutputPath = "bb_info.ndjson";
+	}
+
+	std::error_code EC;
+	raw_fd_ostream OS(OutputPath, EC, sys::fs::OF_None);
+	if (EC) {
         std::cerr << "Failed to open file for writing.\n";
         return;
     }
 
-    os << "{\n";
-    bool firstPair = true; // Used to handle commas between JSON objects
-
-	for (auto i = 0; i < AllData.size(); ++i) {
-		std::string line = AllData[i];
+	const size_t NumFiles = InputFilenames.size();
+	unsigned NumThreads = Jobs ? Jobs : std::max(1u, std::thread::hardware_concurrency());
+	NumThreads = std::max<size_t>(1, std::min<size_t>(NumThreads, NumFiles));
+
+	// Workers may run at most Window files ahead of the writer, which bounds the
+	// number of finished results waiting to be written.
+	const size_t Window = 4 * NumThreads;
+	std::vector<ModuleResult> Results(NumFiles);
+	std::mutex Mu;
+	std::condition_variable ResultReady, SlotFree;
+	size_t NextInput = 0, NextOutput = 0;
+
+	auto Worker = [&] {
+		for (;;) {
+			size_t I;
+			{
+				std::unique_lock<std::mutex> Lock(Mu);
+				SlotFree.wait(Lock, [&] { return NextInput >= NumFiles || NextInput < NextOutput + Window; });
+				if (NextInput >= NumFiles) {
+					return;
+				}
+				I = NextInput++;
+			}
+
+			ModuleResult Result;
+			analyzeModule(InputFilenames[I], Result);
+
+			{
+				std::lock_guard<std::mutex> Lock(Mu);
+				Results[I] = std::move(Result);
+				Results[I].Done = true;
+			}
+			ResultReady.notify_all();
+		}
+	};
 
-		os << line;
+	auto Start = std::chrono::steady_clock::now();
+	std::vector<std::thread> Threads;
+	for (unsigned T = 0; T < NumThreads; ++T) {
+		Threads.emplace_back(Worker);
 	}
-    os << "\n}\n"; // Close the JSON array
-}
 
-static void run(const cl::list<std::string> &InputFilenames)
-{
-    SMDiagnostic Err;
-	std::vector<std::string> AllData;
-
-	for (unsigned i = 0; i < InputFilenames.size(); ++i) {
+	// Modules are written in input order as soon as they are analyzed, so the output is never held in memory.
+	// The top-level stream must receive a value, so it only exists for the single-object format.
+	std::unique_ptr<json::OStream> J;
+	if (!NDJSONOutput) {
+		J = std::make_unique<json::OStream>(OS);
+		J->objectBegin();
+	}
 
-		LLVMContext *LLVMCtx = new LLVMContext();
-		std::unique_ptr<Module> M = parseIRFile(InputFilenames[i], Err, *LLVMCtx);
+	size_t Loaded = 0;
+	for (size_t i = 0; i < NumFiles; ++i) {
+		ModuleResult Result;
+		{
+			std::unique_lock<std::mutex> Lock(Mu);
+			ResultReady.wait(Lock, [&] { return Results[i].Done; });
+			Result = std::move(Results[i]);
+			Results[i] = ModuleResult();
+			NextOutput = i + 1;
+		}
+		SlotFree.notify_all();
 
-		if (M == NULL) {
+		if (!Result.Loaded) {
 			std::cout << InputFilenames[i] << ": error loading file '"
 				<< InputFilenames[i] << "'\n";
 			continue;
 		}
+		++Loaded;
+
+		if (NDJSONOutput) {
+			json::OStream Line(OS);
+			Line.object([&] {
+				Line.attribute("Module", Result.Path);
+				Line.attributeBegin("Functions");
+				Line.rawValue(Result.Functions);
+				Line.attributeEnd();
+			});
+			OS << "\n";
+		} else {
+			J->attributeBegin(Result.Path);
+			J->rawValue(Result.Functions);
+			J->attributeEnd();
+		}
+	}
 
-		countBasicBlocks(*M, AllData);	
+	for (auto &T : Threads) {
+		T.join();
 	}
 
-	AllData.pop_back();
+	if (J) {
+		J->objectEnd();
+		J.reset();
+		OS << "\n";
+	}
 
-	Write2Json(AllData);
-	std::cout << "Output file: " << OutputFilename << "\n";
+	double Seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - Start).count();
+	std::cout << "Analyzed " << Loaded << " module(s) in " << Seconds << "s ("
+		<< (Seconds > 0 ? Loaded / Seconds : 0) << " modules/s, "
+		<< NumThreads << " thread(s))\n";
+	std::cout << "Output file: " << OutputPath << "\n";
 }
 
 int main(int argc, char **argv)
@@ -19,8 +19,15 @@
 #include "llvm/Support/SourceMgr.h"
 #include "llvm/Support/Signals.h"
 #include "llvm/Support/Path.h"
+#include "llvm/Support/JSON.h"
+#include "llvm/Support/raw_ostream.h"
 #include <unistd.h>
 #include <sstream>
 #include <fstream>
 #include <vector>
+#include <algorithm>
+#include <chrono>
+#include <condition_variable>
+#include <mutex>
+#include <thread>
 #endif // IRAnalyzer
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+Indexed SQLite output for parse-bc.py.
+
+The database holds the same data as ll_parsed.yml, one row per fact:
+  files(id, path)                                   analyzed .bc files
+  structs(id, file_id, var, struct_type)            ops-struct initializers (var is e.g. "@ext4_file_operations")
+  struct_functions(struct_id, position, function)   functions referenced by an initializer, in order
+  struct_fields(struct_id, field, function)         initializer field index -> function
+  functions(file_id, name)                          functions defined in a .bc file
+
+Functions, struct variables, struct types and files are indexed, so queries such as
+"which ops-struct initializers reference function X" do not scan the whole table.
+"""
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS structs (id INTEGER PRIMARY KEY, file_id INTEGER NOT NULL,
+                                    var TEXT NOT NULL, struct_type TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS struct_functions (struct_id INTEGER NOT NULL, position INTEGER NOT NULL,
+                                             function TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS struct_fields (struct_id INTEGER NOT NULL, field INTEGER NOT NULL,
+                                          function TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS functions (file_id INTEGER NOT NULL, name TEXT NOT NULL);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS structs_file ON structs (file_id);
+CREATE INDEX IF NOT EXISTS structs_var ON structs (var);
+CREATE INDEX IF NOT EXISTS structs_type ON structs (struct_type);
+CREATE INDEX IF NOT EXISTS struct_functions_struct ON struct_functions (struct_id);
+CREATE INDEX IF NOT EXISTS struct_functions_function ON struct_functions (function);
+CREATE INDEX IF NOT EXISTS struct_fields_struct ON struct_fields (struct_id);
+CREATE INDEX IF NOT EXISTS struct_fields_function ON struct_fields (function);
+CREATE INDEX IF NOT EXISTS functions_file ON functions (file_id);
+CREATE INDEX IF NOT EXISTS functions_name ON functions (name);
+"""
+
+def is_bc_index(path):
+    """Return True if path is an SQLite database (as opposed to a YAML file)."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(16) == b"SQLite format 3\x00"
+    except OSError:
+        return False
+
+class BcIndexWriter:
+    """
+    Write parse-bc.py results to an SQLite database one .bc file at a time.
+    Indexes are created on close(), after the bulk inserts.
+    """
+    def __init__(self, path, commit_every=256):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.executescript(SCHEMA)
+        self.commit_every = commit_every
+        self.pending = 0
+
+    def remove(self, bc_file):
+        """Delete every row recorded for a .bc file."""
+        row = self.conn.execute("SELECT id FROM files WHERE path = ?", (bc_file,)).fetchone()
+        if row is None:
+            return
+        file_id = row[0]
+        struct_ids = "SELECT id FROM structs WHERE file_id = ?"
+        self.conn.execute(f"DELETE FROM struct_functions WHERE struct_id IN ({struct_ids})", (file_id,))
+        self.conn.execute(f"DELETE FROM struct_fields WHERE struct_id IN ({struct_ids})", (file_id,))
+        self.conn.execute("DELETE FROM structs WHERE file_id = ?", (file_id,))
+        self.conn.execute("DELETE FROM functions WHERE file_id = ?", (file_id,))
+        self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def add(self, bc_file, result):
+        """Record the analysis result of one .bc file, replacing any earlier result for it."""
+        self.remove(bc_file)
+        file_id = self.conn.execute("INSERT INTO files (path) VALUES (?)", (bc_file,)).lastrowid
+        result = result or {}
+
+        struct_function_map = result.get("struct_function_map", {})
+        struct_field_map = result.get("struct_field_map", {})
+        for var, struct_type in result.get("struct_type_map", {}).items():
+            struct_id = self.conn.execute("INSERT INTO structs (file_id, var, struct_type) VALUES (?, ?, ?)",
+                                          (file_id, var, struct_type)).lastrowid
+            self.conn.executemany("INSERT INTO struct_functions (struct_id, position, function) VALUES (?, ?, ?)",
+                                  ((struct_id, i, f) for i, f in enumerate(struct_function_map.get(var, []))))
+            self.conn.executemany("INSERT INTO struct_fields (struct_id, field, function) VALUES (?, ?, ?)",
+                                  ((struct_id, int(field), f) for field, f in struct_field_map.get(var, {}).items()))
+
+        self.conn.executemany("INSERT INTO functions (file_id, name) VALUES (?, ?)",
+                              ((file_id, name) for name in result.get("function_definitions", [])))
+
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.conn.commit()
+            self.pending = 0
+
+    def close(self):
+        self.conn.executescript(INDEXES)
+        self.conn.commit()
+        self.conn.close()
+
+class BcIndex:
+    """
+    Read-only queries on a database written by BcIndexWriter.
+    """
+    def __init__(self, path):
+        self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+    def close(self):
+        self.conn.close()
+
+    def initializers_referencing(self, function):
+        """Return [(bc file, struct variable, struct type, field index or None)] of initializers referencing function."""
+        return self.conn.execute("""
+            SELECT files.path, structs.var, structs.struct_type,
+                   (SELECT field FROM struct_fields
+                    WHERE struct_fields.struct_id = structs.id AND struct_fields.function = ?)
+            FROM structs JOIN files ON files.id = structs.file_id
+            WHERE structs.id IN (SELECT struct_id FROM struct_functions WHERE function = ?)
+            ORDER BY files.path, structs.var""", (function, function)).fetchall()
+
+    def files_defining(self, function):
+        """Return the .bc files that define function."""
+        return [row[0] for row in self.conn.execute("""
+            SELECT files.path FROM functions JOIN files ON files.id = functions.file_id
+            WHERE functions.name = ? ORDER BY files.path""", (function,))]
+
+    def structs_of_type(self, struct_type):
+        """Return [(bc file, struct variable)] of the initializers of a struct type."""
+        return self.conn.execute("""
+            SELECT files.path, structs.var FROM structs JOIN files ON files.id = structs.file_id
+            WHERE structs.struct_type = ? ORDER BY files.path, structs.var""", (struct_type,)).fetchall()
+
+    def struct_fields(self):
+        """
+        Yield (bc file, struct variable, struct type, field index, function) for every initializer field,
+        grouped by initializer in file order.
+        """
+        return self.conn.execute("""
+            SELECT files.path, structs.var, structs.struct_type, struct_fields.field, struct_fields.function
+            FROM struct_fields JOIN structs ON structs.id = struct_fields.struct_id
+            JOIN files ON files.id = structs.file_id
+            ORDER BY structs.file_id, structs.id, struct_fields.field""")
+
+    def to_dict(self):
+        """Return the whole database in the ll_parsed.yml layout."""
+        data = {}
+        files = dict(self.conn.execute("SELECT id, path FROM files"))
+        for path in files.values():
+            data[path] = {"struct_function_map": {}, "struct_type_map": {},
+                          "struct_field_map": {}, "function_definitions": []}
+
+        structs = {}
+        for struct_id, file_id, var, struct_type in self.conn.execute(
+                "SELECT id, file_id, var, struct_type FROM structs ORDER BY id"):
+            result = data[files[file_id]]
+            result["struct_type_map"][var] = struct_type
+            structs[struct_id] = (result, var)
+
+        for struct_id, function in self.conn.execute(
+                "SELECT struct_id, function FROM struct_functions ORDER BY struct_id, position"):
+            result, var = structs[struct_id]
+            result["struct_function_map"].setdefault(var, []).append(function)
+
+        for struct_id, field, function in self.conn.execute(
+                "SELECT struct_id, field, function FROM struct_fields ORDER BY struct_id, field"):
+            result, var = structs[struct_id]
+            result["struct_field_map"].setdefault(var, {})[field] = function
+
+        for file_id, name in self.conn.execute("SELECT file_id, name FROM functions ORDER BY rowid"):
+            data[files[file_id]]["function_definitions"].append(name)
+
+        return data
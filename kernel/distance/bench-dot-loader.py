@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import os
+import argparse
+import time
+import networkx as nx
+
+from llvm_dot import parse_dot_file, to_networkx
+
+def find_dot_files(directory, limit):
+    """
+    Recursively search the specified directory and return up to limit .dot files.
+    """
+    dot_files = []
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if file.endswith(".dot") and not file.startswith("distance-"):
+                dot_files.append(os.path.join(root, file))
+                if limit and len(dot_files) >= limit:
+                    return dot_files
+    return dot_files
+
+def read_llvm_dot(dot_file):
+    return to_networkx(parse_dot_file(dot_file))
+
+def read_agraph(dot_file):
+    return nx.drawing.nx_agraph.read_dot(dot_file)
+
+def read_pydot(dot_file):
+    return nx.drawing.nx_pydot.read_dot(dot_file)
+
+LOADERS = {
+    "llvm_dot": read_llvm_dot,
+    "nx_agraph": read_agraph,
+    "nx_pydot": read_pydot,
+}
+
+def benchmark(loader, dot_files):
+    """
+    Load every .dot file with the given loader and return (seconds, nodes, edges, errors).
+    """
+    nodes = 0
+    edges = 0
+    errors = 0
+    start = time.perf_counter()
+    for dot_file in dot_files:
+        try:
+            graph = loader(dot_file)
+        except ImportError:
+            raise
+        except Exception as e:
+            print(f"[-]Error loading {dot_file}: {e}")
+            errors += 1
+            continue
+        nodes += graph.number_of_nodes()
+        edges += graph.number_of_edges()
+    return time.perf_counter() - start, nodes, edges, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare llvm_dot with the networkx .dot readers on a .dot corpus")
+    parser.add_argument('-d', '--directory', type=str, required=True, help="Directory to search for .dot files")
+    parser.add_argument('--limit', type=int, default=0, help="Maximum number of files to load (0 = all)")
+    parser.add_argument('--loaders', type=str, default=",".join(LOADERS), help="Comma-separated loaders to run")
+
+    args = parser.parse_args()
+
+    dot_files = find_dot_files(args.directory, args.limit)
+    size = sum(os.path.getsize(f) for f in dot_files)
+    print(f"[+]{len(dot_files)} files, {size / (1024 * 1024):.1f} MiB")
+
+    results = {}
+    for name in args.loaders.split(","):
+        try:
+            elapsed, nodes, edges, errors = benchmark(LOADERS[name], dot_files)
+        except ImportError as e:
+            print(f"[*]Skip {name}: {e}")
+            continue
+        results[name] = elapsed
+        print(f"{name:10s}: {elapsed:8.2f}s  nodes={nodes} edges={edges} errors={errors}")
+
+    if "llvm_dot" in results and results["llvm_dot"] > 0:
+        for name, elapsed in results.items():
+            if name != "llvm_dot":
+                print(f"[+]llvm_dot is {elapsed / results['llvm_dot']:.1f}x faster than {name}")
+
+if __name__ == "__main__":
+    main()
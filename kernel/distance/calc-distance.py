@@ -1,68 +1,262 @@
 #!/usr/bin/env python3
 import networkx as nx
-import math
+import argparse
+import fnmatch
+import re
 import sys
 import os
+import time
+import hashlib
+import yaml
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from distance_store import create_distance_matrix
+from llvm_dot import parse_dot_file, to_networkx
 
 def load_graph_from_dot(dot_file_path):
     """
     Load a networkx multigraph from an LLVM .dot file and set edge weights
     """
-    # Load the .dot file
-    G = nx.drawing.nx_agraph.read_dot(dot_file_path)
-    
-    # Dictionary to store edge weights
-    edge_weights = {}
-
-    # Extract Probability from the tooltip of edges and set as edge weight
-    for u, v, k, data in G.edges(keys=True, data=True):  # Supports multigraphs
-        tooltip = data.get('tooltip', '')
-        
-        # Extract Probability information
-        probability_str = tooltip.split('Probability ')[-1].strip('%').strip() if 'Probability' in tooltip else None
-        if probability_str is not None:
-            probability = float(probability_str) / 100.0  # e.g. 62.50% -> 0.625
-            # Ensure probability is in the valid range (0 < probability <= 1)
-            if probability > 0:
-                # Calculate weight using the negative logarithm (higher probability = shorter distance)
-                edge_weights[(u, v, k)] = -math.log2(probability)
-            else:
-                # Set a large default weight if the probability is zero or negative
-                edge_weights[(u, v, k)] = float('inf')  # Infinite distance
-        else:
-            # Set a default weight if no probability is found
-            edge_weights[(u, v, k)] = 1.0
-    
-    # Use set_edge_attributes to assign weights to edges in bulk
-    nx.set_edge_attributes(G, edge_weights, 'weight')
-    
-    return G
+    # Edge weights are derived from the Probability in the edge tooltip (-log2(probability))
+    return to_networkx(parse_dot_file(dot_file_path))
+
+def node_name_from_label(label):
+    """
+    Return the function or basic block name from an LLVM .dot node label.
+    e.g. "{ext4_llseek}" -> "ext4_llseek", "{entry:\\l  %0 = ...|...}" -> "entry"
+    """
+    if not label:
+        return None
+    match = re.match(r'"?\{([^:|}\\]+)', label)
+    return match.group(1).strip() if match else None
+
+def load_targets(targets, targets_file):
+    """
+    Collect target names from a comma-separated list and/or a file.
+    The file is either a plain list (one name per line) or the YAML written by patch-analyze.py.
+    """
+    names = set()
+    if targets:
+        names.update(t.strip() for t in targets.split(",") if t.strip())
+
+    if targets_file:
+        with open(targets_file, 'r') as f:
+            data = yaml.safe_load(f)
+
+        if isinstance(data, dict):
+            # patch-analyze.py output: {patch: {"modified_functions": {"added": {...}, "removed": {...}, "modified": {...}}}}
+            for patch in data.values():
+                for functions in patch.get("modified_functions", {}).values():
+                    names.update(functions.keys())
+        elif isinstance(data, list):
+            names.update(str(t) for t in data)
+        elif isinstance(data, str):
+            names.update(data.split())
 
-def calculate_all_pair_distances(dot_file_path, output_filename):
+    names.discard("OutOfFunctionScope")
+    return names
+
+def find_target_nodes(G, target_names):
+    """
+    Return graph nodes whose node ID or label name matches one of the target names.
+    """
+    target_nodes = []
+    for node, data in G.nodes(data=True):
+        if node in target_names or node_name_from_label(data.get("label")) in target_names:
+            target_nodes.append(node)
+    return target_nodes
+
+def calculate_target_distances(dot_file_path, output_filename, target_names, output_format="binary"):
+    """
+    Load an LLVM .dot file and compute the shortest distance from every node to the target set.
+    Runs one multi-source Dijkstra on the reversed graph instead of all pairs.
+    """
+    # Load the graph
+    G = load_graph_from_dot(dot_file_path)
+
+    target_nodes = find_target_nodes(G, target_names)
+    if not target_nodes:
+        print(f"[*]No targets found in {dot_file_path}")
+        # Do not leave the distances of an earlier run behind as if they were computed for these targets
+        remove_distance_output(output_filename)
+        return
+
+    # Distances on the reversed graph from the targets are distances to the targets on the original graph
+    distances = nx.multi_source_dijkstra_path_length(G.reverse(copy=False), target_nodes, weight='weight')
+
+    if output_format == "text":
+        # Output the distance from each node to the nearest target
+        with open(output_filename, "w") as f:
+            for node, distance in distances.items():
+                f.write(f"Distance from {node} to targets: {distance}\n")
+        return
+
+    # One column holding the distance to the nearest target; rows are all nodes, as in all-pairs mode
+    nodes = list(G.nodes())
+    matrix = create_distance_matrix(output_filename, nodes, ["targets"])
+    matrix[:, 0] = [distances.get(node, float("inf")) for node in nodes]
+    matrix.flush()
+
+def calculate_all_pair_distances(dot_file_path, output_filename, output_format="binary"):
     """
     Load an LLVM .dot file and compute the shortest distances between all nodes
     """
     # Load the graph
     G = load_graph_from_dot(dot_file_path)
-    
-    # Compute the shortest path between all nodes
-    all_distances = dict(nx.shortest_path_length(G, weight='weight'))
-    
-    # Output the distances between all node pairs
-    with open(output_filename, "w") as f:
-        for source, target_distances in all_distances.items():
-            for target, distance in target_distances.items():
-                f.write(f"Distance from {source} to {target}: {distance}\n")
+
+    if output_format == "text":
+        # Compute the shortest path between all nodes
+        all_distances = dict(nx.shortest_path_length(G, weight='weight'))
+
+        # Output the distances between all node pairs
+        with open(output_filename, "w") as f:
+            for source, target_distances in all_distances.items():
+                for target, distance in target_distances.items():
+                    f.write(f"Distance from {source} to {target}: {distance}\n")
+        return
+
+    # Fill the memory-mapped matrix one source row at a time
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    matrix = create_distance_matrix(output_filename, nodes, nodes)
+    for source, target_distances in nx.shortest_path_length(G, weight='weight'):
+        row = matrix[index[source]]
+        for target, distance in target_distances.items():
+            row[index[target]] = distance
+    matrix.flush()
+
+def distance_output_filename(dot_file_path):
+    """Return the output file name (or binary prefix) for a .dot file."""
+    basename = os.path.basename(dot_file_path)
+    d = os.path.realpath(os.path.dirname(dot_file_path))
+    return f"{d}/distance-{basename}"
+
+def remove_distance_output(output_filename):
+    """Remove the text output or binary file set written for an output file name."""
+    for filename in [output_filename] + [output_filename + ext for ext in (".npy", ".names", ".targets")]:
+        if os.path.isfile(filename):
+            os.remove(filename)
+
+def run_parameters(target_names, output_format):
+    """
+    Return the line written to <output>.params after a run: the output format and
+    either "all-pairs" or "targets" with a digest of the target set.
+    """
+    if not target_names:
+        return f"{output_format} all-pairs"
+    digest = hashlib.sha1("\n".join(sorted(target_names)).encode()).hexdigest()
+    return f"{output_format} targets {digest}"
+
+def is_up_to_date(dot_file_path, target_names, output_format):
+    """
+    Return True if the .dot file was processed after its last change with the same
+    mode, target set and output format.
+    """
+    params_filename = distance_output_filename(dot_file_path) + ".params"
+    try:
+        if os.path.getmtime(params_filename) < os.path.getmtime(dot_file_path):
+            return False
+        with open(params_filename, "r") as f:
+            return f.read().strip() == run_parameters(target_names, output_format)
+    except OSError:
+        return False
+
+def process_dot_file(dot_file_path, target_names, output_format):
+    """
+    Calculate distances for a single .dot file.
+    Used as the worker function of the batch mode, so errors are returned instead of raised.
+    """
+    output_filename = distance_output_filename(dot_file_path)
+    params_filename = output_filename + ".params"
+    try:
+        # The parameters are recorded only once the output is complete
+        if os.path.isfile(params_filename):
+            os.remove(params_filename)
+        if target_names:
+            # Calculate shortest distances from every node to the targets
+            calculate_target_distances(dot_file_path, output_filename, target_names, output_format)
+        else:
+            # Calculate shortest distances between all node pairs
+            calculate_all_pair_distances(dot_file_path, output_filename, output_format)
+        with open(params_filename, "w") as f:
+            f.write(run_parameters(target_names, output_format) + "\n")
+        return dot_file_path, None
+    except Exception as e:
+        return dot_file_path, str(e)
+
+def find_dot_files(directory, pattern):
+    """
+    Recursively search the directory for .dot files matching the pattern, skipping distance outputs.
+    """
+    dot_files = []
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if fnmatch.fnmatch(file, pattern) and not file.startswith("distance-"):
+                dot_files.append(os.path.join(root, file))
+    return dot_files
+
+def process_directory(directory, pattern, target_names, output_format, jobs, force=False):
+    """
+    Calculate distances for every .dot file under a directory with a single worker pool,
+    so networkx and friends are imported once per worker rather than once per file.
+    Files already processed with the same parameters are skipped unless force is set.
+    """
+    dot_files = find_dot_files(directory, pattern)
+    pending = [f for f in dot_files if force or not is_up_to_date(f, target_names, output_format)]
+    print(f"[+]{len(dot_files)} .dot files found, {len(dot_files) - len(pending)} up to date")
+
+    start = time.perf_counter()
+    done = 0
+    errors = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(process_dot_file, f, target_names, output_format) for f in pending]
+        for future in as_completed(futures):
+            dot_file_path, error = future.result()
+            done += 1
+            if error:
+                errors += 1
+                print(f"[-]Error processing {dot_file_path}: {error}")
+            else:
+                print(f"[+]Parsed {dot_file_path}")
+
+    elapsed = time.perf_counter() - start
+    rate = done / elapsed if elapsed > 0 else 0.0
+    print(f"[+]Processed {done} files ({errors} errors) in {elapsed:.2f}s: {rate:.2f} files/s")
+
+def parse_options():
+    parser = argparse.ArgumentParser(description="Calculate shortest distances in an LLVM .dot call graph or CFG")
+    parser.add_argument("dotfile", nargs="?", help="LLVM .dot file")
+    parser.add_argument("-d", "--directory", help="Process every .dot file under this directory", metavar="DIRECTORY")
+    parser.add_argument("--pattern", default="*.dot", help="File name pattern used with --directory")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of worker processes used with --directory")
+    parser.add_argument("--targets", help="Comma-separated target function/basic block names", metavar="NAME1,NAME2")
+    parser.add_argument("--targets-file", help="File with target names (one per line, or patch-analyze.py YAML output)",
+                        metavar="FILE")
+    parser.add_argument("--format", choices=["binary", "text"], default="binary",
+                        help="Output format: binary (.npy matrix + name tables) or legacy text lines")
+    parser.add_argument("--force", action="store_true",
+                        help="With --directory, also recompute files whose output is up to date")
+
+    args = parser.parse_args()
+    if bool(args.dotfile) == bool(args.directory):
+        parser.error("specify either a dot file or --directory")
+
+    return args
 
 if __name__ == "__main__":
-    if not len(sys.argv) == 2:
-        print(f"[*]Usage {sys.argv[0]} <dot file>")
-        exit(1)
-    
-    dotfile = sys.argv[1]
-    basename = os.path.basename(dotfile)
-    d = os.path.realpath(os.path.dirname(dotfile))
-
-    output_filename = f"{d}/distance-{basename}"
-    # Calculate shortest distances between all node pairs
-    calculate_all_pair_distances(dotfile, output_filename)
+    args = parse_options()
+
+    target_names = None
+    if args.targets or args.targets_file:
+        target_names = load_targets(args.targets, args.targets_file)
+        if not target_names:
+            print("[-]No target names given")
+            sys.exit(1)
+
+    if args.directory:
+        process_directory(args.directory, args.pattern, target_names, args.format, args.jobs, args.force)
+    else:
+        dotfile, error = process_dot_file(args.dotfile, target_names, args.format)
+        if error:
+            print(f"[-]Error processing {dotfile}: {error}")
+            sys.exit(1)
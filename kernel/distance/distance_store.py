@@ -0,0 +1,56 @@
+"""
+Compact binary distance files written by calc-distance.py.
+
+A distance file set shares one prefix (e.g. distance-foo.dot):
+  <prefix>.npy      float32 matrix, rows are source nodes and columns are targets (inf = unreachable)
+  <prefix>.names    source node names, one per line, in row order
+  <prefix>.targets  target names, one per line, in column order
+  <prefix>.params   format, mode and target set digest of the run (calc-distance.py skips unchanged runs)
+
+The matrix is a plain .npy file, so it can be opened with mmap_mode='r' and a
+single (source, target) lookup only touches the page holding that entry.
+"""
+import numpy as np
+
+def write_names(filename, names):
+    """Write an interned name table, one name per line."""
+    with open(filename, "w") as f:
+        for name in names:
+            f.write(f"{name}\n")
+
+def read_names(filename):
+    """Read a name table written by write_names."""
+    with open(filename, "r") as f:
+        return f.read().splitlines()
+
+def create_distance_matrix(prefix, source_names, target_names):
+    """
+    Write the name tables and return a writable memory-mapped matrix filled with inf.
+    Rows can be filled one at a time so the whole result never has to be held in memory.
+    """
+    write_names(f"{prefix}.names", source_names)
+    write_names(f"{prefix}.targets", target_names)
+
+    matrix = np.lib.format.open_memmap(f"{prefix}.npy", mode="w+", dtype=np.float32,
+                                       shape=(len(source_names), len(target_names)))
+    matrix[:] = np.inf
+    return matrix
+
+class DistanceMatrix:
+    """
+    Read-only view of a binary distance file set.
+    """
+    def __init__(self, prefix):
+        self.matrix = np.load(f"{prefix}.npy", mmap_mode="r")
+        self.sources = read_names(f"{prefix}.names")
+        self.targets = read_names(f"{prefix}.targets")
+        self.source_index = {name: i for i, name in enumerate(self.sources)}
+        self.target_index = {name: i for i, name in enumerate(self.targets)}
+
+    def distance(self, source, target):
+        """Return the distance from source to target (inf if unreachable)."""
+        return float(self.matrix[self.source_index[source], self.target_index[target]])
+
+    def distances_to(self, target):
+        """Return the distance column for a target as a memory-mapped array."""
+        return self.matrix[:, self.target_index[target]]
@@ -0,0 +1,133 @@
+"""
+Streaming parser for the .dot files written by LLVM's -dot-cfg and -dot-callgraph passes.
+
+LLVM writes one statement per line, e.g.
+
+	Node0x55d0c8f0a6f0 [shape=record,label="{entry:\l  ...|{<s0>T|<s1>F}}"];
+	Node0x55d0c8f0a6f0:s0 -> Node0x55d0c8f0a7a0 [tooltip="entry -> if.then\nProbability 37.50%" ];
+
+so nodes, labels, edges and edge probabilities can be read in a single pass
+without going through pygraphviz or pydot. Edges are kept in flat arrays.
+Node names never include the record port (":s0"), for both CFG and call graph files.
+"""
+import array
+import math
+import re
+
+NODE_PATTERN = re.compile(r'^\s*"?(\w+)"?\s*\[(.*)\];?\s*$')
+EDGE_PATTERN = re.compile(r'^\s*"?(\w+)"?(?::\w+)?\s*->\s*"?(\w+)"?(?::\w+)?\s*(?:\[(.*)\])?;?\s*$')
+GRAPH_PATTERN = re.compile(r'^\s*(?:strict\s+)?(?:di)?graph\s+"?(.*?)"?\s*\{\s*$')
+LABEL_PATTERN = re.compile(r'(?:^|[,\s])label\s*=\s*"((?:[^"\\]|\\.)*)"')
+TOOLTIP_PATTERN = re.compile(r'(?:^|[,\s])tooltip\s*=\s*"((?:[^"\\]|\\.)*)"')
+PROBABILITY_PATTERN = re.compile(r'Probability\s+([0-9.]+)%')
+
+class DotGraph:
+    """
+    A parsed LLVM .dot graph.
+    nodes[i] is the node name (e.g. Node0x...), labels[i] its label.
+    Edge j goes from nodes[src[j]] to nodes[dst[j]] with branch probability prob[j] (NaN if unknown).
+    """
+    def __init__(self, name=""):
+        self.name = name
+        self.nodes = []
+        self.labels = []
+        self.src = array.array('i')
+        self.dst = array.array('i')
+        self.prob = array.array('d')
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        return len(self.src)
+
+def unescape(s):
+    """Undo the escaping of double quotes inside a quoted dot string."""
+    return s.replace('\\"', '"')
+
+def parse_dot_lines(lines, name=""):
+    """
+    Parse LLVM .dot text given as an iterable of lines and return a DotGraph.
+    """
+    graph = DotGraph(name)
+    index = {}
+    nodes = graph.nodes
+    labels = graph.labels
+
+    def intern(node):
+        i = index.get(node)
+        if i is None:
+            i = index[node] = len(nodes)
+            nodes.append(node)
+            labels.append("")
+        return i
+
+    for line in lines:
+        if "->" in line:
+            match = EDGE_PATTERN.match(line)
+            if match:
+                graph.src.append(intern(match.group(1)))
+                graph.dst.append(intern(match.group(2)))
+                probability = math.nan
+                attrs = match.group(3)
+                if attrs and "Probability" in attrs:
+                    tooltip = TOOLTIP_PATTERN.search(attrs)
+                    if tooltip:
+                        p = PROBABILITY_PATTERN.search(tooltip.group(1))
+                        if p:
+                            probability = float(p.group(1)) / 100.0
+                graph.prob.append(probability)
+                continue
+
+        match = NODE_PATTERN.match(line)
+        if match:
+            node = match.group(1)
+            if node in ("graph", "node", "edge"):
+                continue
+            i = intern(node)
+            label = LABEL_PATTERN.search(match.group(2))
+            if label:
+                labels[i] = unescape(label.group(1))
+            continue
+
+        if not graph.name:
+            match = GRAPH_PATTERN.match(line)
+            if match:
+                graph.name = unescape(match.group(1))
+
+    return graph
+
+def parse_dot_file(dot_file_path):
+    """
+    Parse an LLVM .dot file and return a DotGraph.
+    """
+    with open(dot_file_path, 'r', errors='replace') as f:
+        return parse_dot_lines(f)
+
+def edge_weight(probability):
+    """
+    Convert a branch probability to an edge weight.
+    Higher probability means shorter distance; unknown probability weighs 1.0.
+    """
+    if math.isnan(probability):
+        return 1.0
+    if probability > 0:
+        return -math.log2(probability)
+    return float('inf')
+
+def to_networkx(graph, weights=True):
+    """
+    Build a networkx MultiDiGraph from a DotGraph.
+    Nodes carry the 'label' attribute; edges carry 'weight' when weights is True.
+    """
+    import networkx as nx
+
+    G = nx.MultiDiGraph()
+    nodes = graph.nodes
+    G.add_nodes_from((node, {"label": label}) for node, label in zip(nodes, graph.labels))
+    if weights:
+        G.add_edges_from((nodes[u], nodes[v], {"weight": edge_weight(p)})
+                         for u, v, p in zip(graph.src, graph.dst, graph.prob))
+    else:
+        G.add_edges_from((nodes[u], nodes[v]) for u, v in zip(graph.src, graph.dst))
+    return G
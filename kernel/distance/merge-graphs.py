@@ -1,11 +1,20 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import networkx as nx
 from pathlib import Path
 import argparse
 import pickle
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from llvm_dot import parse_dot_file, edge_weight
+from result_cache import load_cache, save_cache
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "scripts"))
+from graph_store import save_networkx_graph_store
 
 def find_dot_files(directory, cfg_opt):
     """
@@ -29,39 +38,116 @@ def find_dot_files(directory, cfg_opt):
 
 def load_dot_file(dot_file):
     """
-    Load a .dot file and return it as a networkx graph.
+    Load a .dot file and return it as a DotGraph.
+    Runs in a worker process, so only the compact DotGraph is sent back to the parent.
     """
     try:
-        graph = nx.drawing.nx_pydot.read_dot(dot_file)
-        print(f"Loaded: {dot_file}")
-        if not isinstance(graph, (nx.Graph, nx.DiGraph, nx.MultiDiGraph)):
-            raise ValueError("Loaded object is not a valid networkx graph.")
-        return graph
+        return parse_dot_file(dot_file)
     except Exception as e:
         print(f"Error loading {dot_file}: {e}")
         return None
 
-
-def process_dot_files(dot_files):
+def load_dot_files(dot_files, max_workers):
     """
-    Process the specified list of .dot files and merge them into a single graph.
-    If the graph is a MultiDiGraph, use compose_all.
+    Load the .dot files in a process pool and return the parsed graphs in file order
+    (None for files that failed to load).
     """
+    if not dot_files:
+        return []
+
     graph_list = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for dot_file, graph in zip(dot_files, executor.map(load_dot_file, dot_files, chunksize=16)):
+            if graph is not None:
+                print(f"Loaded .dot file: {dot_file}")
+            graph_list.append(graph)
+    return graph_list
+
+def file_stamp(dot_file, use_hash):
+    """
+    Return the value used to decide whether a cached fragment is still valid:
+    the content hash, or (mtime, size).
+    """
+    if use_hash:
+        h = hashlib.sha1()
+        with open(dot_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    st = os.stat(dot_file)
+    return (st.st_mtime_ns, st.st_size)
+
+def load_dot_files_cached(dot_files, max_workers, cache_file, use_hash):
+    """
+    Load the .dot files, parsing only files that are new or changed since the cached run.
+    Fragments of files that no longer exist are dropped from the cache.
+    """
+    cache = load_cache(cache_file)  # {dot file path: (stamp, DotGraph)}
+    new_cache = {}
+    stamps = {}
+    changed = []
 
     for dot_file in dot_files:
-        graph = load_dot_file(dot_file)
+        stamp = file_stamp(dot_file, use_hash)
+        cached = cache.get(dot_file)
+        if cached is not None and cached[0] == stamp:
+            new_cache[dot_file] = cached
+        else:
+            stamps[dot_file] = stamp
+            changed.append(dot_file)
+
+    removed = len(set(cache) - set(dot_files))
+    print(f"[+]Cache: {len(new_cache)} unchanged, {len(changed)} new or changed, {removed} removed")
+
+    for dot_file, graph in zip(changed, load_dot_files(changed, max_workers)):
         if graph is not None:
-            print(f"Loaded .dot file: {dot_file}")
-            graph_list.append(graph)
+            new_cache[dot_file] = (stamps[dot_file], graph)
+
+    if cache_file and (changed or removed):
+        save_cache(new_cache, cache_file)
+
+    return [new_cache[f][1] for f in dot_files if f in new_cache]
+
+def merge_graphs(graph_list):
+    """
+    Merge the parsed graphs into a single MultiDiGraph with one bulk build.
+    Same result as nx.compose_all: later node labels win and parallel edges are keyed per file.
+    """
+    merged_graph = nx.MultiDiGraph()
+
+    for graph in graph_list:
+        nodes = graph.nodes
+        merged_graph.add_nodes_from(nodes)
+        merged_graph.add_nodes_from((node, {"label": label}) for node, label in zip(nodes, graph.labels) if label)
+
+        edges = []
+        keys = {}
+        for u, v, p in zip(graph.src, graph.dst, graph.prob):
+            k = keys.get((u, v), 0)
+            keys[(u, v)] = k + 1
+            edges.append((nodes[u], nodes[v], k, {"weight": edge_weight(p)}))
+        merged_graph.add_edges_from(edges)
+
+    return merged_graph
 
-    # Check if any of the graphs are MultiDiGraph
-    if any(isinstance(g, nx.MultiDiGraph) for g in graph_list):
-        merged_graph = nx.compose_all(graph_list)  # Merge MultiDiGraph
+def process_dot_files(dot_files, max_workers, cache_file=None, use_hash=False):
+    """
+    Process the specified list of .dot files and merge them into a single graph.
+    """
+    start = time.perf_counter()
+    if cache_file:
+        graph_list = load_dot_files_cached(dot_files, max_workers, cache_file, use_hash)
     else:
-        merged_graph = nx.DiGraph()  # Initialize an empty directed graph
-        for g in graph_list:
-            merged_graph = nx.compose(merged_graph, g)  # Merge DiGraphs
+        graph_list = [g for g in load_dot_files(dot_files, max_workers) if g is not None]
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    merged_graph = merge_graphs(graph_list)
+    merge_time = time.perf_counter() - start
+
+    print(f"[+]Load: {len(graph_list)} files in {load_time:.2f}s ({max_workers} workers)")
+    print(f"[+]Merge: {merged_graph.number_of_nodes()} nodes, {merged_graph.number_of_edges()} edges in {merge_time:.2f}s")
 
     return merged_graph  # Return the merged graph
 
@@ -78,8 +164,13 @@ def main():
     parser = argparse.ArgumentParser(description="Search and process .dot files in a directory")
     parser.add_argument('-d', '--directory', type=str, required=True, help="Directory to search for .dot files")
     parser.add_argument('--cfg', action='store_true', default=False, help="Parse Control Flow Graph")
-    parser.add_argument('--max-workers', type=int, default=4, help="Max thread number")
+    parser.add_argument('--max-workers', type=int, default=4, help="Max number of worker processes used to load .dot files")
     parser.add_argument('-o', '--output-directory', type=str, default=".", help="Directory to output graph file")
+    parser.add_argument('--no-cache', action='store_true', default=False, help="Do not use the parsed fragment cache")
+    parser.add_argument('--cache-hash', action='store_true', default=False,
+                        help="Validate cached fragments by content hash instead of mtime and size")
+    parser.add_argument('--store', action='store_true', default=False,
+                        help="Also save the merged graph as a memory-mappable CSR graph store")
 
     args = parser.parse_args()
 
@@ -89,16 +180,25 @@ def main():
         print(f"Invalid directory: {directory}")
         return
 
-    # Process .dot files
-    dot_files = find_dot_files(directory, args.cfg)
-    merged_graph = process_dot_files(dot_files)
-
     if args.cfg:
         filename = f"{args.output_directory}/cfg-graph.pickle"
     else:
         filename = f"{args.output_directory}/cg-graph.pickle"
 
+    # Parsed per-file fragments are kept next to the output so reruns only parse changed files
+    cache_file = None if args.no_cache else f"{filename}.cache"
+
+    # Process .dot files
+    dot_files = find_dot_files(directory, args.cfg)
+    merged_graph = process_dot_files(dot_files, args.max_workers, cache_file, args.cache_hash)
+
+    start = time.perf_counter()
     save_graph_to_pickle(merged_graph, filename)
+    if args.store:
+        store_directory = filename.replace(".pickle", ".store")
+        save_networkx_graph_store(store_directory, merged_graph)
+        print(f"Merged graph store saved to {store_directory}")
+    print(f"[+]Save: {time.perf_counter() - start:.2f}s")
 
 if __name__ == "__main__":
     main()
@@ -1,27 +1,89 @@
 #!/usr/bin/env python3
 import os
 import re
+import hashlib
 import yaml
 import subprocess
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def extract_struct_function_pointers(ll_file_content):
+from bc_index import BcIndexWriter
+from result_cache import load_cache, save_cache
+
+FIELD_FUNCTION_PATTERN = re.compile(r'@([\w.$]+)')
+FUNCTION_DEFINITION_PATTERN = re.compile(r'define.*?@(\w+)\s*\(')
+# define/declare ... @name(  (every function of the module, for telling functions from other globals)
+FUNCTION_NAME_PATTERN = re.compile(r'^(?:define|declare)\b.*?@([\w.$]+)\s*\(')
+
+# Results in the cache are only reused if they were produced by the same scanner
+SCANNER_VERSION = b"2"
+
+def split_initializer_fields(line, start):
+    """
+    Split the struct initializer that starts at the '{' at position start into its top-level fields.
+    Commas inside nested (), [], {} and <> (function types, constant expressions, nested structs) are ignored.
     """
-    Extract function pointers and types from an LLVM IR (.ll) file line by line.
+    fields = []
+    depth = 0
+    field_start = start + 1
+    for i in range(start, len(line)):
+        c = line[i]
+        if c in "([{<":
+            depth += 1
+        elif c in ")]}>":
+            depth -= 1
+            if depth == 0:
+                fields.append(line[field_start:i])
+                break
+        elif c == ',' and depth == 1:
+            fields.append(line[field_start:i])
+            field_start = i + 1
+    return fields
+
+def extract_struct_field_functions(line, start):
+    """
+    Return {field index: global name} for the top-level fields of a struct initializer
+    that hold a pointer to a global (e.g. "i64 (%struct.file*, i64, i32)* @ext4_llseek" or "ptr @ext4_llseek").
+    Globals that are not functions (e.g. @__this_module) are dropped by scan_ll_lines().
+    """
+    field_functions = {}
+    for index, field in enumerate(split_initializer_fields(line, start)):
+        field = field.strip()
+        if field.startswith("{") or "{" in field.split("@")[0]:
+            continue  # Nested struct, its functions do not belong to a top-level field
+        match = FIELD_FUNCTION_PATTERN.search(field)
+        if match:
+            field_functions[index] = match.group(1)
+    return field_functions
+
+def scan_ll_lines(lines):
+    """
+    Extract function pointers, structure types and function definitions from LLVM IR text
+    in a single pass over its lines, so the IR can be streamed from llvm-dis without
+    keeping the whole module in memory.
     Identify structures using '@structure_name =' and extract the data inside the last {}.
     """
     struct_function_map = {}
     struct_type_map = {}
+    struct_field_map = {}
     current_struct = None
     inside_struct = False
     functions = []
+    function_definitions = []
+    function_names = set()  # Functions defined or declared in the module
 
     # Regular expressions to detect structure start, function pointers, and type information
-    struct_start_pattern = re.compile(r'(@\w+)\s*=\s*.*%struct\.(\w+)')  # To find @struct_name = %struct.type_name
+    struct_start_pattern = re.compile(r'(@\w+)\s*=\s*.*?%struct\.(\w+)')  # To find @struct_name = %struct.type_name
     function_pointer_pattern = re.compile(r'ptr\s+@(\w+)')  # To find ptr @function_name
 
-    for line in ll_file_content.splitlines():
+    for line in lines:
+        # Function definitions
+        if "define" in line:
+            function_definitions.extend(FUNCTION_DEFINITION_PATTERN.findall(line))
+        if line.startswith(("define", "declare")):
+            function_names.update(FUNCTION_NAME_PATTERN.findall(line))
+
         # Check if this line starts a structure and records its type
         struct_match = struct_start_pattern.match(line)
         if struct_match:
@@ -30,6 +92,12 @@ def extract_struct_function_pointers(ll_file_content):
             current_struct = struct_match.group(1)
             struct_type = struct_match.group(2)
             struct_type_map[current_struct] = struct_type  # Save the struct's type information
+            # Record which initializer field holds which function, for (struct type, field index) lookups
+            initializer = line.find("{", struct_match.end())
+            if initializer >= 0:
+                field_functions = extract_struct_field_functions(line, initializer)
+                if field_functions:
+                    struct_field_map[current_struct] = field_functions
             functions = []
             inside_struct = True  # Now we are inside a structure
 
@@ -49,14 +117,16 @@ def extract_struct_function_pointers(ll_file_content):
     if current_struct and functions:
         struct_function_map[current_struct] = functions
 
-    return struct_function_map, struct_type_map
+    # Functions are defined and declared after the globals, so fields are filtered at the end
+    for var in list(struct_field_map):
+        fields = {index: name for index, name in struct_field_map[var].items() if name in function_names}
+        if fields:
+            struct_field_map[var] = fields
+        else:
+            del struct_field_map[var]
 
-def extract_function_definitions(ll_file_content):
-    """
-    Extract function definitions from an LLVM IR (.ll) file.
-    """
-    function_definitions = re.findall(r'define.*?@(\w+)\s*\(', ll_file_content)
-    return function_definitions
+    return {"struct_function_map": struct_function_map, "struct_type_map": struct_type_map,
+            "struct_field_map": struct_field_map, "function_definitions": function_definitions}
 
 def analyze_ll_file(ll_file):
     """
@@ -64,15 +134,7 @@ def analyze_ll_file(ll_file):
     Return a dictionary of results for the .ll file.
     """
     with open(ll_file, 'r') as f:
-        ll_file_content = f.read()
-
-    # Extract struct function pointers and types
-    struct_function_map, struct_type_map = extract_struct_function_pointers(ll_file_content)
-    
-    # Extract function definitions
-    function_definitions = extract_function_definitions(ll_file_content)
-    
-    return {"struct_function_map": struct_function_map, "struct_type_map": struct_type_map, "function_definitions": function_definitions}
+        return scan_ll_lines(f)
 
 def bc_to_ll(bc_file, llvm_bin_dir):
     """
@@ -83,24 +145,120 @@ def bc_to_ll(bc_file, llvm_bin_dir):
     subprocess.run([f"{llvm_bin_dir}/llvm-dis", bc_file, '-o', ll_file], check=True)
     return ll_file
 
-def process_bc_file(bc_file, llvm_bin_dir):
+PROFILE_PHASES = ("disassembly", "read", "parse")
+
+class DisassemblyStream:
+    """
+    Iterate over the lines of `llvm-dis -o -` output without writing a .ll file.
+    The number of bytes read is kept in `size`. If timings is a dict, the time spent
+    waiting on llvm-dis and decoding its output is added to its "disassembly" and "read" entries.
+    """
+    def __init__(self, bc_file, llvm_bin_dir, timings=None):
+        self.bc_file = bc_file
+        self.llvm_bin_dir = llvm_bin_dir
+        self.timings = timings
+        self.size = 0
+
+    def __iter__(self):
+        proc = subprocess.Popen([f"{self.llvm_bin_dir}/llvm-dis", self.bc_file, '-o', '-'],
+                                stdout=subprocess.PIPE, bufsize=1024 * 1024)
+        try:
+            if self.timings is None:
+                for raw_line in proc.stdout:
+                    self.size += len(raw_line)
+                    yield raw_line.decode('utf-8', errors='replace')
+            else:
+                yield from self._timed_lines(proc.stdout)
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, proc.args)
+
+    def _timed_lines(self, stdout):
+        timings = self.timings
+        clock = time.perf_counter
+        while True:
+            start = clock()
+            raw_line = stdout.readline()
+            decoded = clock()
+            timings["disassembly"] += decoded - start
+            if not raw_line:
+                return
+            self.size += len(raw_line)
+            line = raw_line.decode('utf-8', errors='replace')
+            timings["read"] += clock() - decoded
+            yield line
+
+def process_bc_file(bc_file, llvm_bin_dir, keep_ll=False, profile=False):
     """
-    Process a .bc file: convert to .ll and analyze the resulting .ll file.
+    Process a .bc file and return (bc_file, result, bytes of IR streamed instead of written, timings, seconds).
+    By default the llvm-dis output is parsed as it is produced; with keep_ll the .ll file is
+    written next to the .bc file and analyzed from disk.
+    timings maps each of PROFILE_PHASES to seconds when profile is set, otherwise it is None.
     """
+    timings = dict.fromkeys(PROFILE_PHASES, 0.0) if profile else None
+    start = time.perf_counter()
     try:
-        ll_file = bc_to_ll(bc_file, llvm_bin_dir)
-        struct_function_map = analyze_ll_file(ll_file)
-        return bc_file, struct_function_map
+        if keep_ll:
+            ll_file = bc_to_ll(bc_file, llvm_bin_dir)
+            disassembled = time.perf_counter()
+            with open(ll_file, 'r') as f:
+                lines = f.readlines()
+            read = time.perf_counter()
+            result = scan_ll_lines(lines)
+            if profile:
+                timings["disassembly"] = disassembled - start
+                timings["read"] = read - disassembled
+                timings["parse"] = time.perf_counter() - read
+            return bc_file, result, 0, timings, time.perf_counter() - start
+
+        print(f"Run llvm-dis for {bc_file}")
+        stream = DisassemblyStream(bc_file, llvm_bin_dir, timings)
+        result = scan_ll_lines(stream)
+        elapsed = time.perf_counter() - start
+        if profile:
+            # Time not spent waiting on llvm-dis or decoding was spent in the scanner
+            timings["parse"] = elapsed - timings["disassembly"] - timings["read"]
+        return bc_file, result, stream.size, timings, elapsed
     except Exception as e:
-        return bc_file, {}
+        return bc_file, {}, 0, timings, time.perf_counter() - start
+
+def file_hash(bc_file):
+    """Return the SHA-1 of a .bc file's content and the scanner version."""
+    h = hashlib.sha1(SCANNER_VERSION)
+    with open(bc_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
 
-def analyze_bc_files_recursively(bc_directory, max_workers, llvm_bin_dir):
+def print_profile(timings, elapsed, max_workers):
+    """Print the per-phase time summed over all workers."""
+    total = sum(timings.values())
+    print(f"[INFO] Profile ({max_workers} workers, {elapsed:.2f}s wall clock, {total:.2f}s worker time):")
+    for phase in PROFILE_PHASES:
+        share = timings[phase] / total * 100 if total else 0.0
+        print(f"[INFO]   {phase:12s} {timings[phase]:8.2f}s  {share:5.1f}%")
+
+def analyze_bc_files_recursively(bc_directory, max_workers, llvm_bin_dir, keep_ll=False, profile=False, writer=None,
+                                 cache_file=None):
     """
-    Recursively analyze all .bc files in a directory, converting them to .ll files,
-    and then extracting function pointer assignments using a thread pool for parallel processing.
+    Recursively analyze all .bc files in a directory, disassembling them with llvm-dis,
+    and then extracting function pointer assignments using a process pool for parallel processing.
+    If writer is given, each result is passed to writer.add() as soon as it is ready instead of
+    being collected in the returned dictionary.
+    If cache_file is given, files whose content hash matches the cached run are not analyzed again.
     """
     all_results = {}
     bc_files = []
+    streamed_bytes = 0
+    timings = dict.fromkeys(PROFILE_PHASES, 0.0)
+
+    def add_result(bc_file, result):
+        if writer is not None:
+            writer.add(bc_file, result)
+        else:
+            all_results[bc_file] = result
 
     # Recursively find all .bc files in the directory
     for root, _, files in os.walk(bc_directory):
@@ -108,13 +266,50 @@ def analyze_bc_files_recursively(bc_directory, max_workers, llvm_bin_dir):
             if file.endswith('.bc'):
                 bc_files.append(os.path.join(root, file))
 
-    # Use ThreadPoolExecutor to parallelize the process
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(process_bc_file, bc_file, llvm_bin_dir): bc_file for bc_file in bc_files}
+    # The scanner is pure Python, so use processes rather than threads to parse in parallel
+    start = time.perf_counter()
+    cache = load_cache(cache_file)  # {bc file path: (content hash, result, seconds it took to analyze)}
+    new_cache = {}
+    hashes = {}
+    changed = bc_files
+    saved_time = 0.0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        if cache_file:
+            # Reuse the results of byte-identical .bc files from the previous run
+            changed = []
+            for bc_file, digest in zip(bc_files, executor.map(file_hash, bc_files, chunksize=16)):
+                cached = cache.get(bc_file)
+                if cached is not None and cached[0] == digest:
+                    new_cache[bc_file] = cached
+                    saved_time += cached[2]
+                    add_result(bc_file, cached[1])
+                else:
+                    hashes[bc_file] = digest
+                    changed.append(bc_file)
+
+        futures = {executor.submit(process_bc_file, bc_file, llvm_bin_dir, keep_ll, profile): bc_file for bc_file in changed}
 
         for future in as_completed(futures):
-            bc_file, result = future.result()
-            all_results[bc_file] = result
+            bc_file, result, size, file_timings, elapsed = future.result()
+            add_result(bc_file, result)
+            if cache_file and result:
+                new_cache[bc_file] = (hashes[bc_file], result, elapsed)
+            streamed_bytes += size
+            if file_timings:
+                for phase, seconds in file_timings.items():
+                    timings[phase] += seconds
+
+    if not keep_ll:
+        print(f"[INFO] Streamed {streamed_bytes / (1024 * 1024):.1f} MiB of disassembly without writing .ll files")
+    if profile:
+        print_profile(timings, time.perf_counter() - start, max_workers)
+    if cache_file:
+        hits = len(bc_files) - len(changed)
+        removed = len(set(cache) - set(bc_files))
+        print(f"[INFO] Cache: {hits} hits, {len(changed)} misses, {removed} removed, "
+              f"~{saved_time:.2f}s of analysis saved")
+        if changed or removed:
+            save_cache(new_cache, cache_file)
 
     return all_results
 
@@ -127,18 +322,44 @@ def main():
     # Set up argument parsing
     parser = argparse.ArgumentParser(description="Recursively analyze .bc files, convert them to .ll files, and extract function pointers, structure types, and functions.")
     parser.add_argument('-b', '--bc_directory', type=str, required=True, help="Directory containing .bc files to be analyzed")
-    parser.add_argument('-o', '--output_yaml', type=str, default='ll_parsed.yml', help="Output YAML file to store the extracted data")
-    parser.add_argument('-t', '--threads', type=int, default=4, help="Number of parallel threads to use for processing")
+    parser.add_argument('-o', '--output_yaml', type=str, default=None,
+                        help="Output file to store the extracted data (default: ll_parsed.yml, or ll_parsed.db with --format sqlite)")
+    parser.add_argument('--format', choices=['yaml', 'sqlite'], default='yaml',
+                        help="Output format: one YAML document, or an SQLite database indexed by function, struct type and .bc file")
+    parser.add_argument('-t', '--threads', type=int, default=4, help="Number of parallel worker processes to use for processing")
     parser.add_argument('--llvm-bin-dir', required=True, help="PATH to llvm binaries directory")
+    parser.add_argument('--keep-ll', action='store_true', default=False,
+                        help="Write .ll files next to the .bc files and analyze them from disk (legacy behaviour)")
+    parser.add_argument('--no-cache', action='store_true', default=False,
+                        help="Analyze every .bc file instead of reusing the results of unchanged files from the last run")
+    parser.add_argument('--profile', action='store_true', default=False,
+                        help="Report the time spent in disassembly, reading and parsing")
 
     args = parser.parse_args()
 
+    output = args.output_yaml or ('ll_parsed.db' if args.format == 'sqlite' else 'll_parsed.yml')
+
+    # Per-file results are kept next to the output, keyed on the .bc content hash
+    cache_file = None if args.no_cache else f"{output}.cache"
+
+    if args.format == 'sqlite':
+        # Write each result to the database as soon as its worker finishes
+        if os.path.exists(output):
+            os.remove(output)
+        writer = BcIndexWriter(output)
+        analyze_bc_files_recursively(args.bc_directory, args.threads, args.llvm_bin_dir, args.keep_ll, args.profile, writer,
+                                     cache_file)
+        writer.close()
+        print(f"[INFO] Results saved to {output}")
+        return
+
     # Analyze all .bc files recursively in the given directory with specified number of threads
-    all_results = analyze_bc_files_recursively(args.bc_directory, args.threads, args.llvm_bin_dir)
+    all_results = analyze_bc_files_recursively(args.bc_directory, args.threads, args.llvm_bin_dir, args.keep_ll, args.profile,
+                                               cache_file=cache_file)
 
     # Save the results to a YAML file
-    save_to_yaml(all_results, args.output_yaml)
-    print(f"[INFO] Results saved to {args.output_yaml}")
+    save_to_yaml(all_results, output)
+    print(f"[INFO] Results saved to {output}")
 
 if __name__ == "__main__":
     main()
@@ -2,16 +2,52 @@
 
 import yaml
 import os
-import networkx as nx
 import argparse
 import pickle
 import re
+import sys
+import logging
+from collections import Counter, defaultdict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "scripts"))
+from graph_store import GraphStore, is_graph_store
+from bc_index import BcIndex, is_bc_index
+
+logger = logging.getLogger("parse-call-graph")
+
+STAT_NAMES = ["blocks scanned", "stores detected", "calls resolved", "calls unresolved",
+              "targets not in call graph", "edges added", "paths written"]
+
+DEFAULT_MAX_PATHS = 1000
+DEFAULT_MAX_DEPTH = 10
+
+# store %struct.T* @var, %struct.T** %x  /  store ptr @var, ptr %x
+STORE_PATTERN = re.compile(r'store\s+(?:ptr|%struct\.[\w.]+\*)\s+@([\w.$]+),')
+# %p = getelementptr inbounds %struct.T, %struct.T* %x, i64 0, i32 F  (opaque pointers: ptr %x)
+GEP_PATTERN = re.compile(r'(%[\w.]+)\s*=\s*getelementptr\s+(?:inbounds\s+)?%struct\.(\w+),\s*[^,]+,\s*i(?:32|64)\s+0,\s*i32\s+(\d+)')
+# %f = load i64 (...)*, i64 (...)** %p, align 8  /  %f = load ptr, ptr %p, align 8
+LOAD_PATTERN = re.compile(r'(%[\w.]+)\s*=\s*load\s[^\\]*\s(%[\w.]+)')
+# call ... %f(...)  (a direct call has an @function before the argument list)
+INDIRECT_CALL_PATTERN = re.compile(r'\bcall\s+[^@\\]*?(%[\w.]+)\(')
 
 def load_yaml(yaml_file):
     """Load struct-function mapping from a YAML file."""
     with open(yaml_file, 'r') as f:
         return yaml.safe_load(f)
 
+def load_struct_field_index(yaml_file):
+    """
+    Load the indirect call resolution index (see build_struct_field_index) from parse-bc.py output,
+    a YAML file or an SQLite database. The database is queried directly instead of being loaded whole.
+    """
+    if is_bc_index(yaml_file):
+        index = BcIndex(yaml_file)
+        try:
+            return build_struct_field_index_from_db(index)
+        finally:
+            index.close()
+    return build_struct_field_index(load_yaml(yaml_file))
+
 def extract_braced_text(s):
     """Extract text enclosed in braces."""
     if not s:
@@ -20,7 +56,9 @@ def extract_braced_text(s):
     return match.group(1) if match else None
 
 def load_graph_from_pickle(pickle_file):
-    """Load a graph from a Pickle file."""
+    """Load a graph from a Pickle file or a graph store directory."""
+    if is_graph_store(pickle_file):
+        return GraphStore.load(pickle_file).to_networkx()
     with open(pickle_file, 'rb') as f:
         return pickle.load(f)
 
@@ -33,90 +71,186 @@ def build_label_to_node_map(graph):
             label_to_node[label] = node
     return label_to_node
 
-def extract_function_pointer_calls(block_label):
-    if "ext4_file_operations" in block_label:
-        print(f"[DEBUG] ext4_file_operations detected in CFG node {cfg_node}")
+def build_struct_field_index(parsed_bc):
+    """
+    Build the indirect call resolution index from parse-bc.py output.
+    Returns:
+      field_index: (struct type, field index) -> set of functions stored in that field by any initializer
+      struct_fields: (bc file, ops-struct variable (e.g. "@ext4_file_operations")) -> (struct type, {field index: function})
+    Static initializers such as @fops occur in many modules, so variables are only unique per .bc file.
+    """
+    field_index = defaultdict(set)
+    struct_fields = {}
 
+    for bc_file, result in (parsed_bc or {}).items():
+        if not result:
+            continue
+        struct_type_map = result.get("struct_type_map", {})
+        for var, fields in result.get("struct_field_map", {}).items():
+            struct_type = struct_type_map.get(var)
+            if not struct_type:
+                continue
+            fields = {int(k): v for k, v in fields.items()}
+            for field, function in fields.items():
+                field_index[(struct_type, field)].add(function)
+            struct_fields[(bc_file, var)] = (struct_type, fields)
+
+    return field_index, struct_fields
+
+def build_struct_field_index_from_db(index):
+    """Same as build_struct_field_index() for a BcIndex."""
+    field_index = defaultdict(set)
+    struct_fields = {}
+
+    for bc_file, var, struct_type, field, function in index.struct_fields():
+        key = (bc_file, var)
+        if key not in struct_fields:
+            struct_fields[key] = (struct_type, {})
+        struct_fields[key][1][field] = function
+        field_index[(struct_type, field)].add(function)
+
+    return field_index, struct_fields
+
+def label_cfg_functions(cfg_graph):
     """
-    Extract potential function pointer calls from a block label.
-    Includes both direct member access (->) and getelementptr instructions for file_operations open calls.
+    Return {CFG node: function id}. No CFG edge crosses a function boundary, so the
+    functions of the merged CFG are its weakly connected components.
     """
-    # Adjust pattern to include flexible field indexing for getelementptr instructions
-    function_pointer_call_pattern = re.compile(
-        r'(\w+)->(\w+)\s*\(|%(\w+)\s*=\s*getelementptr\s+inbounds\s+%struct\.(\w+), ptr\s+%\w+, (?:i32|i64)\s+\d+, i32\s+(\d+)'
-    )
-    matches = function_pointer_call_pattern.findall(block_label)
-
-    calls = []
-    for match in matches:
-        if match[0] and match[1]:  # Direct struct access like "f_op->open()"
-            calls.append((match[0], match[1]))
-        elif match[2] and match[3] and match[4]:  # GEP (getelementptr) with flexible field index
-            struct_name = match[3]
-            field_index = int(match[4])
-            if struct_name == "file_operations" and field_index == 0:  # Check for open at index 0
-                calls.append((struct_name, "open"))
-
-    if calls:
-        print(f"[DEBUG] Function pointer calls detected: {calls}")
-    return calls
-
-def dynamically_build_struct_function_map(call_graph, cfg_graph, struct_function_map):
+    function_of = {}
+    function_id = 0
+    for start in cfg_graph.nodes():
+        if start in function_of:
+            continue
+        function_id += 1
+        function_of[start] = function_id
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for neighbor in list(cfg_graph.successors(node)) + list(cfg_graph.predecessors(node)):
+                if neighbor not in function_of:
+                    function_of[neighbor] = function_id
+                    stack.append(neighbor)
+    return function_of
+
+def dynamically_build_struct_function_map(call_graph, cfg_graph, struct_field_index, stats=None):
     """
-    Track the use of struct file_operations and resolve function pointer calls.
+    Resolve GEP-based indirect calls in the CFG to functions in the call graph in one linear sweep.
+
+    A block that loads a function pointer with
+      %p = getelementptr %struct.T, ..., i32 0, i32 F
+      %f = load ..., %p
+    and calls %f is resolved through the (T, F) index from load_struct_field_index().
+    GEPs of data fields (not loaded and called in the block) are ignored.
+    If an ops-struct variable of type T was stored earlier in the same function (store ... @var, ...),
+    only the function in field F of that variable is used. Variables initialized in more than one
+    .bc file cannot be told apart by name, so their stores fall back to the (T, F) index.
+    Counts (blocks scanned, stores detected, calls resolved/unresolved, ...) are added to stats.
     """
+    if stats is None:
+        stats = Counter()
+    field_index, struct_fields = struct_field_index
+    initializers = defaultdict(list)  # ops-struct variable -> [(bc file, variable)]
+    for key in struct_fields:
+        initializers[key[1]].append(key)
     call_label_to_node = build_label_to_node_map(call_graph)
-    stored_variables = {}
+    function_of = None  # CFG node -> function id, built at the first store
+    stored_structs = {}  # (function id, struct type) -> (bc file, variable) last stored, or None if ambiguous
+    new_edges = []
+    debug = logger.isEnabledFor(logging.DEBUG)
 
     for cfg_node, cfg_data in cfg_graph.nodes(data=True):
-        block_label = cfg_data.get("label", "")
-        print(f"[DEBUG] Processing CFG node {cfg_node} with label: {block_label}")
-
-        # Detect store operations related to struct file_operations
-        store_match = re.search(r'store ptr @(\w+), ptr %(\w+)', block_label)
-        if store_match:
-            struct_name, var_name = store_match.groups()
-            if struct_name == "ext4_file_operations":
-                stored_variables[var_name] = "ext4_file_operations"
-                print(f"[DEBUG] Detected store to ext4_file_operations in variable %{var_name}")
-
-        # Check if stored variables are used in subsequent function calls
-        for var_name, struct_name in stored_variables.items():
-            if var_name in block_label:
-                print(f"[DEBUG] Variable %{var_name} (ext4_file_operations) used in: {block_label}")
-
-                # Detect GEP or load operations on the stored variable
-                if "getelementptr" in block_label or "load" in block_label:
-                    print(f"[DEBUG] Detected getelementptr or load using variable %{var_name} in block: {block_label}")
-
-                    # Extract function pointer calls from the block label
-                    calls = extract_function_pointer_calls(block_label)
-                    if calls:
-                        print(f"[DEBUG] Function pointer calls detected: {calls}")
-
-                        # Resolve the function pointer to the actual function
-                        for struct_name, func_ptr_name in calls:
-                            if struct_name in struct_function_map:
-                                real_function = struct_function_map[struct_name].get(func_ptr_name)
-                                if real_function:
-                                    print(f"[DEBUG] Resolved function pointer {func_ptr_name} to function {real_function}")
-                                    if real_function in call_label_to_node:
-                                        target_node = call_label_to_node[real_function]
-                                        print(f"[DEBUG] Adding edge from CFG node {cfg_node} to CG node {target_node} ({real_function})")
-                                        call_graph.add_edge(cfg_node, target_node)
-                                    else:
-                                        print(f"[WARNING] Function {real_function} not found in call graph.")
-                                else:
-                                    print(f"[WARNING] Could not resolve function pointer {func_ptr_name} in struct {struct_name}")
-                    else:
-                        print(f"[DEBUG] No function pointer calls found in block {block_label}")
-
-def integrate_cfg_with_graph(call_graph, cfg_graph, target_function, struct_function_map):
+        # Long instructions are wrapped as "...\l... rest"; join them back into one line
+        block_label = cfg_data.get("label", "").replace("\\l...", "")
+        stats["blocks scanned"] += 1
+        if debug:
+            logger.debug("Processing CFG node %s with label: %s", cfg_node, block_label)
+
+        # Track stores of known ops-struct variables
+        for match in STORE_PATTERN.finditer(block_label):
+            var = "@" + match.group(1)
+            keys = initializers.get(var)
+            if keys:
+                if function_of is None:
+                    function_of = label_cfg_functions(cfg_graph)
+                for key in keys:
+                    stored_structs[(function_of[cfg_node], struct_fields[key][0])] = key if len(keys) == 1 else None
+                stats["stores detected"] += 1
+                logger.debug("Detected store of %s in CFG node %s", var, cfg_node)
+
+        called = set(INDIRECT_CALL_PATTERN.findall(block_label))
+        if not called:
+            continue
+        loaded_from = {pointer: value for value, pointer in LOAD_PATTERN.findall(block_label)}
+
+        for match in GEP_PATTERN.finditer(block_label):
+            if loaded_from.get(match.group(1)) not in called:
+                continue  # Not a function pointer that is called in this block
+            struct_type, field = match.group(2), int(match.group(3))
+
+            key = stored_structs.get((function_of[cfg_node], struct_type)) if stored_structs else None
+            if key is not None and field in struct_fields[key][1]:
+                candidates = {struct_fields[key][1][field]}
+            else:
+                candidates = field_index.get((struct_type, field))
+
+            if not candidates:
+                stats["calls unresolved"] += 1
+                logger.debug("Could not resolve function pointer %s[%d] in CFG node %s", struct_type, field, cfg_node)
+                continue
+
+            stats["calls resolved"] += 1
+            for real_function in candidates:
+                if real_function in call_label_to_node:
+                    target_node = call_label_to_node[real_function]
+                    logger.debug("Adding edge from CFG node %s to CG node %s (%s)", cfg_node, target_node, real_function)
+                    new_edges.append((cfg_node, target_node))
+                else:
+                    stats["targets not in call graph"] += 1
+                    logger.debug("Function %s not found in call graph.", real_function)
+
+    call_graph.add_edges_from(new_edges)
+    stats["edges added"] += len(new_edges)
+
+def iter_paths_to_target(call_graph, target_node, max_paths, max_depth):
+    """
+    Enumerate simple paths ending at target_node with one reverse DFS from the target.
+    Every partial reverse walk is a path from some source node, so paths are yielded
+    (in source-to-target order) as soon as they are found. At most max_paths paths of
+    at most max_depth edges are produced.
+    """
+    path = [target_node]
+    on_path = {target_node}
+    stack = [iter(call_graph.predecessors(target_node))]
+    count = 0
+
+    while stack and count < max_paths:
+        predecessor = next(stack[-1], None)
+        if predecessor is None:
+            stack.pop()
+            on_path.discard(path.pop())
+            continue
+        if predecessor in on_path:
+            continue
+
+        path.append(predecessor)
+        on_path.add(predecessor)
+        count += 1
+        yield path[::-1]
+
+        if len(path) <= max_depth:
+            stack.append(iter(call_graph.predecessors(predecessor)))
+        else:
+            on_path.discard(path.pop())
+
+def integrate_cfg_with_graph(call_graph, cfg_graph, target_function, struct_field_index,
+                             max_paths=DEFAULT_MAX_PATHS, max_depth=DEFAULT_MAX_DEPTH, output=sys.stdout, stats=None):
     """
     Integrate the CFG graph information into the call graph by matching the function name.
     Also handles struct-based function pointers, including static initializations from YAML.
     """
-    dynamically_build_struct_function_map(call_graph, cfg_graph, struct_function_map)
+    if stats is None:
+        stats = Counter()
+    dynamically_build_struct_function_map(call_graph, cfg_graph, struct_field_index, stats)
 
     # Build a map from function labels to nodes in the call graph
     call_label_to_node = build_label_to_node_map(call_graph)
@@ -125,53 +259,58 @@ def integrate_cfg_with_graph(call_graph, cfg_graph, target_function, struct_func
     # Find the corresponding node in the call graph by the function name
     if target_function in call_label_to_node:
         call_graph_node = call_label_to_node[target_function]
-        print(f"[DEBUG] Found corresponding call graph node for function {target_function}: {call_graph_node}")
-
-        # Explore all paths to the target function from any node in the graph
-        paths_to_function = []
-        for source_node in call_graph.nodes():
-            if source_node != call_graph_node:
-                try:
-                    paths = list(nx.all_simple_paths(call_graph, source=source_node, target=call_graph_node))
-                    paths_to_function.extend(paths)
-                except nx.NetworkXNoPath:
-                    continue
-
-        # Print all the paths to the target function with NodeID and FunctionName
-        if paths_to_function:
-            print(f"All paths to {target_function}:")
-            for path in paths_to_function:
-                path_with_functions = []
-                for node in path:
-                    fn_name = node_to_function_label.get(node, "Unknown")
-                    path_with_functions.append(f"{node}({fn_name})")
-                print(" -> ".join(path_with_functions))
-        else:
-            print(f"No paths found to {target_function}.")
+        logger.debug("Found corresponding call graph node for function %s: %s", target_function, call_graph_node)
+
+        # Write the paths to the target function with NodeID and FunctionName as they are found
+        found = 0
+        for path in iter_paths_to_target(call_graph, call_graph_node, max_paths, max_depth):
+            if found == 0:
+                output.write(f"All paths to {target_function}:\n")
+            found += 1
+            path_with_functions = []
+            for node in path:
+                fn_name = node_to_function_label.get(node, "Unknown")
+                path_with_functions.append(f"{node}({fn_name})")
+            output.write(" -> ".join(path_with_functions) + "\n")
+
+        if found == 0:
+            logger.info("No paths found to %s.", target_function)
+        elif found >= max_paths:
+            logger.info("Path limit (%d) reached. Stopping exploration.", max_paths)
+        stats["paths written"] += found
     else:
-        print(f"[ERROR] Function {target_function} not found in the call graph.")
+        logger.error("Function %s not found in the call graph.", target_function)
 
 def main():
     # Use argparse to process command-line arguments
     parser = argparse.ArgumentParser(description="Find all call paths to a specific function in a graph, considering function pointers.")
-    parser.add_argument('--cg', type=str, required=True, help="Path to the Pickle file containing the call graph")
+    parser.add_argument('--cg', type=str, required=True, help="Path to the Pickle file (or graph store directory) containing the call graph")
     parser.add_argument('--function', type=str, required=True, help="Target function to find paths to")
-    parser.add_argument('--cfg', type=str, required=True, help="Path to the Pickle CFG file for function pointers")
-    parser.add_argument('--yaml', type=str, required=True, help="YAML file with struct-function pointer mappings")
+    parser.add_argument('--cfg', type=str, required=True, help="Path to the Pickle CFG file (or graph store directory) for function pointers")
+    parser.add_argument('--yaml', type=str, required=True, help="YAML file or SQLite database with struct-function pointer mappings (parse-bc.py output)")
+    parser.add_argument('--max-paths', type=int, default=DEFAULT_MAX_PATHS, help="Maximum number of paths to output")
+    parser.add_argument('--max-depth', type=int, default=DEFAULT_MAX_DEPTH, help="Maximum path length (number of edges)")
+    parser.add_argument('-o', '--output', type=str, default=None, help="Write paths to this file instead of stdout")
+    parser.add_argument('--log-level', type=str, default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Log level (DEBUG prints every CFG block)")
+    parser.add_argument('--stats', action='store_true', default=False,
+                        help="Print summary counters (blocks scanned, stores detected, calls resolved, ...) at the end")
 
     args = parser.parse_args()
 
+    logging.basicConfig(level=args.log_level, format="[%(levelname)s] %(message)s")
+
     cg_file = args.cg
     target_function = args.function
     cfg_file = args.cfg
     yaml_file = args.yaml
 
-    # Load struct-function mappings from YAML
-    struct_function_map = load_yaml(yaml_file)
+    # Load struct-function mappings from YAML (or the SQLite database)
+    struct_field_index = load_struct_field_index(yaml_file)
 
-    # Check if the Pickle file exists
-    if not os.path.isfile(cg_file):
-        print(f"Invalid file: {cg_file}")
+    # Check if the Pickle file (or graph store) exists
+    if not os.path.isfile(cg_file) and not is_graph_store(cg_file):
+        logger.error("Invalid file: %s", cg_file)
         return
 
     # Load the call graph from the Pickle file
@@ -181,7 +320,18 @@ def main():
     cfg_graph = load_graph_from_pickle(cfg_file)
 
     # Integrate CFG with the call graph and print the paths to the target function
-    integrate_cfg_with_graph(call_graph, cfg_graph, target_function, struct_function_map)
+    stats = Counter()
+    if args.output:
+        with open(args.output, "w") as output:
+            integrate_cfg_with_graph(call_graph, cfg_graph, target_function, struct_field_index,
+                                     args.max_paths, args.max_depth, output, stats)
+    else:
+        integrate_cfg_with_graph(call_graph, cfg_graph, target_function, struct_field_index,
+                                 args.max_paths, args.max_depth, stats=stats)
+
+    if args.stats:
+        for name in STAT_NAMES:
+            logger.info("%s: %d", name, stats[name])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,30 @@
+"""
+Pickled per-file result caches shared by merge-graphs.py and parse-bc.py.
+
+A cache maps an input file path to a tuple whose first item is the stamp
+(content hash, or mtime and size) the result was computed for.
+"""
+import os
+import pickle
+
+def load_cache(cache_file):
+    """
+    Load a result cache. A missing or unreadable cache is treated as empty.
+    """
+    if not cache_file or not os.path.isfile(cache_file):
+        return {}
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        print(f"[*]Ignore broken cache {cache_file}: {e}")
+        return {}
+
+def save_cache(cache, cache_file):
+    """
+    Save a result cache atomically.
+    """
+    tmp_file = f"{cache_file}.tmp"
+    with open(tmp_file, 'wb') as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, cache_file)
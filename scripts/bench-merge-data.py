@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+import os
+import argparse
+import importlib.util
+import time
+import tracemalloc
+
+from callgraph_index import CallgraphIndex, is_callgraph_index, build_callgraph_index
+from callgraph_stats import CallSiteStats
+
+def load_merge_data():
+    """Import merge-data.py, which cannot be imported by name."""
+    path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "merge-data.py")
+    spec = importlib.util.spec_from_file_location("merge_data", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def run_dict_engine(merge_data, index_directory, bb_info):
+    cg_data = merge_data.read_callgraph_index(index_directory)
+    merged = merge_data.merge_data_by_function(cg_data, bb_info)
+    return merged, merge_data.merge_data_by_file(merged)
+
+def run_numpy_engine(merge_data, index_directory, bb_info):
+    stats = CallSiteStats(CallgraphIndex.load(index_directory))
+    return merge_data.merge_data_with_stats(stats, bb_info)
+
+ENGINES = {
+    "dict": run_dict_engine,
+    "numpy": run_numpy_engine,
+}
+
+def benchmark(engine, merge_data, index_directory, bb_info, repeat):
+    """
+    Run an engine repeat times and return (best seconds, peak traced memory in bytes, result).
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = engine(merge_data, index_directory, bb_info)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    engine(merge_data, index_directory, bb_info)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the merge-data.py aggregation engines")
+    parser.add_argument("--bcfiles-dir", required=True,
+                        help="path to bcfiles, or a callgraph index written by index-callgraph.py")
+    parser.add_argument("--bb-info-json", required=True, help="BasicBlock information json")
+    parser.add_argument("--index", default="callgraph.index",
+                        help="Where to write the callgraph index if --bcfiles-dir is a bcfiles directory")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per engine")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of worker processes")
+
+    args = parser.parse_args()
+
+    # Both engines read the same index so only the aggregation is compared
+    index_directory = args.bcfiles_dir
+    if not is_callgraph_index(index_directory):
+        build_callgraph_index(args.bcfiles_dir, args.jobs).save(args.index)
+        index_directory = args.index
+
+    merge_data = load_merge_data()
+    bb_info = merge_data.read_bb_info_json(args.bb_info_json)
+    index = CallgraphIndex.load(index_directory)
+    print(f"[+]{index.number_of_records()} call records, {len(index.files)} files")
+
+    results = {}
+    for name, engine in ENGINES.items():
+        elapsed, peak, result = benchmark(engine, merge_data, index_directory, bb_info, args.repeat)
+        results[name] = (elapsed, result)
+        print(f"{name:6s}: {elapsed:8.3f}s  peak {peak / (1024 * 1024):8.1f} MiB")
+
+    if results["dict"][1] != results["numpy"][1]:
+        print("[-]The engines produced different results")
+    elif results["numpy"][0] > 0:
+        print(f"[+]Same results, numpy is {results['dict'][0] / results['numpy'][0]:.1f}x faster than dict")
+
+if __name__ == "__main__":
+    main()
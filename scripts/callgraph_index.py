@@ -0,0 +1,227 @@
+"""
+Columnar index of the DeepType callgraph-*.json files of a bcfiles directory.
+
+The JSON files are parsed once (in parallel) and every call record is kept as one
+row of a column table. Strings are interned, so the columns are plain int arrays:
+  files.txt      .bc file of each callgraph JSON, one per line (file id = line number)
+  names.txt      interned function names, one per line (name id = line number)
+  file.npy       int32 file id of each record
+  caller.npy     int32 name id of CallerName
+  callee.npy     int32 name id of CalleeName
+  line.npy       int64 SourceLine
+  indirect.npy   bool isIndirectCall
+
+Rows are grouped by file in the order the files were found and keep the record
+order of each file, so consumers see the same order as when reading the JSON files.
+The .npy columns are opened with mmap_mode='r'.
+"""
+import glob
+import json
+import os
+import re
+import array
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from graph_store import read_lines, write_lines
+
+COLUMNS = ("file", "caller", "callee", "line", "indirect")
+
+def find_callgraph_files(directory_path):
+    """Return the callgraph-*.json files below a bcfiles directory."""
+    return glob.glob(os.path.join(directory_path, '**', 'callgraph-*.json'), recursive=True)
+
+def bc_filename_of(json_file, directory_path):
+    """
+    Return the .bc file a callgraph-<name>.json file was generated from.
+    If directory_path has no bcfiles component, the .bc file is assumed to sit next to the JSON file.
+    """
+    name = re.search(r"-(.*?)[.]", os.path.basename(json_file)).group(1) + ".bc"
+    components = directory_path.split("/")
+    if "bcfiles" not in components:
+        return os.path.abspath(os.path.join(os.path.dirname(json_file), name))
+    idx = components.index("bcfiles") + 1
+    tmp = json_file.split("/")
+    paths = "/".join(tmp[idx:len(tmp) - 1])
+    return os.path.abspath(directory_path + paths + "/" + name)
+
+def iter_call_records(json_file, stream=False):
+    """Yield call records from a callgraph JSON file, optionally with the incremental ijson parser."""
+    if stream:
+        import ijson
+        with open(json_file, 'rb') as f:
+            yield from ijson.items(f, 'item')
+    else:
+        with open(json_file, 'r') as f:
+            yield from json.load(f) or []
+
+def read_callgraph_records(json_file, stream=False, edges_only=False):
+    """
+    Parse one callgraph JSON file in a worker process.
+    Returns (local name table, caller ids, callee ids, source lines, indirect flags, number of records, error).
+    With edges_only, only CallerName and CalleeName are read, duplicate (caller, callee) pairs are
+    dropped and the source line and indirect flag arrays are left empty.
+    """
+    names = []
+    index = {}
+    callers = array.array('i')
+    callees = array.array('i')
+    lines = array.array('q')
+    indirect = array.array('b')
+    edges = set()
+    records = 0
+
+    def intern(name):
+        i = index.get(name)
+        if i is None:
+            i = index[name] = len(names)
+            names.append(name)
+        return i
+
+    try:
+        for data in iter_call_records(json_file, stream):
+            records += 1
+            if edges_only:
+                edges.add((intern(data['CallerName']), intern(data['CalleeName'])))
+                continue
+            callers.append(intern(data['CallerName']))
+            callees.append(intern(data['CalleeName']))
+            lines.append(int(data['SourceLine']))
+            indirect.append(1 if data['isIndirectCall'] else 0)
+    except Exception as e:
+        return names, array.array('i'), array.array('i'), array.array('q'), array.array('b'), records, str(e)
+
+    if edges_only:
+        callers = array.array('i', (u for u, v in edges))
+        callees = array.array('i', (v for u, v in edges))
+    return names, callers, callees, lines, indirect, records, None
+
+def iter_callgraph_files(json_files, max_workers, stream, edges_only, names):
+    """
+    Parse the callgraph JSON files in a process pool and yield
+    (json file, caller ids, callee ids, source lines, indirect flags, number of records) in file order.
+    Name ids are global: new names are appended to names. Files that fail to parse are reported and skipped.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(read_callgraph_records, json_files, [stream] * len(json_files),
+                               [edges_only] * len(json_files), chunksize=16)
+        for json_file, (local_names, callers, callees, lines, indirect, records, error) in zip(json_files, results):
+            if error:
+                print(f"Error processing file {json_file}: {error}")
+                continue
+
+            # Map the file-local ids to global ids
+            remap = []
+            for name in local_names:
+                i = index.get(name)
+                if i is None:
+                    i = index[name] = len(names)
+                    names.append(name)
+                remap.append(i)
+            remap = np.asarray(remap, dtype=np.int32)
+
+            yield (json_file, remap[np.frombuffer(callers, dtype=np.int32)], remap[np.frombuffer(callees, dtype=np.int32)],
+                   np.frombuffer(lines, dtype=np.int64), np.frombuffer(indirect, dtype=np.int8).astype(bool), records)
+
+def build_callgraph_index(directory_path, max_workers, stream=False, json_files=None):
+    """
+    Parse the callgraph JSON files of a bcfiles directory in a process pool and return a CallgraphIndex.
+    Files that fail to parse are reported and left out.
+    """
+    if json_files is None:
+        json_files = find_callgraph_files(directory_path)
+
+    files = []
+    names = []
+    columns = {name: [] for name in COLUMNS}
+
+    for json_file, callers, callees, lines, indirect, _ in iter_callgraph_files(json_files, max_workers, stream,
+                                                                               False, names):
+        columns["file"].append(np.full(len(callers), len(files), dtype=np.int32))
+        columns["caller"].append(callers)
+        columns["callee"].append(callees)
+        columns["line"].append(lines)
+        columns["indirect"].append(indirect)
+        files.append(bc_filename_of(json_file, directory_path))
+
+    dtypes = {"file": np.int32, "caller": np.int32, "callee": np.int32, "line": np.int64, "indirect": bool}
+    arrays = {name: np.concatenate(parts) if parts else np.empty(0, dtype=dtypes[name])
+              for name, parts in columns.items()}
+    return CallgraphIndex(files, names, **arrays)
+
+def build_callgraph_edges(json_files, max_workers, stream=False):
+    """
+    Edges-only mode of build_callgraph_index(): workers read only the caller and callee names and
+    send back deduplicated edges, so records without SourceLine or isIndirectCall are accepted.
+    Returns (node names, caller ids, callee ids, number of records) with edges deduplicated.
+    """
+    names = []
+    src = []
+    dst = []
+    records = 0
+
+    for _, callers, callees, _, _, count in iter_callgraph_files(json_files, max_workers, stream, True, names):
+        src.append(callers)
+        dst.append(callees)
+        records += count
+
+    if not src:
+        return names, np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), records
+
+    # Remove edges found in more than one file
+    edges = np.unique(np.stack([np.concatenate(src), np.concatenate(dst)], axis=1), axis=0)
+    return names, edges[:, 0], edges[:, 1], records
+
+def is_callgraph_index(path):
+    return os.path.isfile(os.path.join(path, "files.txt")) and os.path.isfile(os.path.join(path, "caller.npy"))
+
+class CallgraphIndex:
+    """
+    Column table of call records. Use file_ranges() to walk the records one .bc file at a time.
+    """
+    def __init__(self, files, names, file, caller, callee, line, indirect):
+        self.files = files
+        self.names = names
+        self.file = file
+        self.caller = caller
+        self.callee = callee
+        self.line = line
+        self.indirect = indirect
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        write_lines(os.path.join(directory, "files.txt"), self.files)
+        write_lines(os.path.join(directory, "names.txt"), self.names)
+        for name in COLUMNS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory):
+        """Open an index directory; the columns are memory-mapped."""
+        columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in COLUMNS}
+        return cls(read_lines(os.path.join(directory, "files.txt")),
+                   read_lines(os.path.join(directory, "names.txt")), **columns)
+
+    def number_of_records(self):
+        return len(self.caller)
+
+    def file_ranges(self):
+        """Yield (bc file, start row, end row) for every file that has at least one record."""
+        counts = np.bincount(np.asarray(self.file), minlength=len(self.files))
+        ends = np.cumsum(counts)
+        for file_id, (count, end) in enumerate(zip(counts.tolist(), ends.tolist())):
+            if count:
+                yield self.files[file_id], end - count, end
+
+    def name_ids(self, names):
+        """Return the ids of the given function names that occur in the index."""
+        wanted = set(names)
+        return np.array([i for i, name in enumerate(self.names) if name in wanted], dtype=np.int32)
+
+    def unique_edges(self):
+        """Return (caller ids, callee ids) of the distinct caller -> callee pairs."""
+        if not len(self.caller):
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        edges = np.unique(np.stack([np.asarray(self.caller), np.asarray(self.callee)], axis=1), axis=0)
+        return edges[:, 0], edges[:, 1]
@@ -0,0 +1,99 @@
+"""
+Grouped call statistics over a CallgraphIndex, computed with array operations.
+
+A call site is a (file, caller, source line) group of call records. DeepType writes
+one record per call target, so the first record of a site says whether the call is
+indirect and the number of records is the number of targets.
+
+Sites and functions are kept in the order they first appear in the index, which is
+the order the nested dicts of merge-data.py are built in.
+"""
+import numpy as np
+
+def group_starts(*keys):
+    """Return the start positions of the runs of equal key tuples in sorted key arrays."""
+    n = len(keys[0])
+    start = np.zeros(n, dtype=bool)
+    if n:
+        start[0] = True
+        for key in keys:
+            start[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(start)
+
+class CallSiteStats:
+    """
+    Per-site and per-function call statistics of a CallgraphIndex.
+
+    Sites (sorted by first record):
+      site_file, site_caller, site_line   group key
+      site_indirect                       isIndirectCall of the first record
+      site_records                        number of records (call targets)
+    Functions (sorted by first record):
+      func_file, func_caller
+      func_indirect_calls                 indirect call sites
+      func_indirect_targets               call targets of the indirect call sites
+    """
+    def __init__(self, index):
+        self.index = index
+        file = np.asarray(index.file)
+        caller = np.asarray(index.caller)
+        line = np.asarray(index.line)
+        indirect = np.asarray(index.indirect)
+        n = len(file)
+
+        # lexsort is stable, so the first row of each run is the first record of the site
+        order = np.lexsort((line, caller, file))
+        starts = group_starts(file[order], caller[order], line[order])
+        first_row = order[starts]
+        records = np.diff(np.append(starts, n))
+
+        by_row = np.argsort(first_row, kind="stable")
+        first_row = first_row[by_row]
+        self.site_first_row = first_row
+        self.site_file = file[first_row]
+        self.site_caller = caller[first_row]
+        self.site_line = line[first_row]
+        self.site_indirect = indirect[first_row]
+        self.site_records = records[by_row]
+
+        # Sites of one function keep their first-record order, so the first site gives the function's first record
+        order = np.lexsort((self.site_caller, self.site_file))
+        starts = group_starts(self.site_file[order], self.site_caller[order])
+        indirect_calls = self.site_indirect.astype(np.int64)[order]
+        indirect_targets = (self.site_records * self.site_indirect)[order]
+        if len(starts):
+            indirect_calls = np.add.reduceat(indirect_calls, starts)
+            indirect_targets = np.add.reduceat(indirect_targets, starts)
+        else:
+            indirect_calls = np.empty(0, dtype=np.int64)
+            indirect_targets = np.empty(0, dtype=np.int64)
+        func_first_site = order[starts]
+
+        by_row = np.argsort(func_first_site, kind="stable")
+        func_first_site = func_first_site[by_row]
+        self.func_file = self.site_file[func_first_site]
+        self.func_caller = self.site_caller[func_first_site]
+        self.func_indirect_calls = indirect_calls[by_row]
+        self.func_indirect_targets = indirect_targets[by_row]
+
+    def modules(self):
+        """
+        Return {bc file: file id} for the files with records, in first-seen order.
+        If several callgraph files map to the same .bc file, the last one wins.
+        """
+        counts = np.bincount(np.asarray(self.index.file), minlength=len(self.index.files))
+        modules = {}
+        for file_id, (bc_file, count) in enumerate(zip(self.index.files, counts.tolist())):
+            if count:
+                modules[bc_file] = file_id
+        return modules
+
+    def function_range(self, file_id):
+        """Return the (start, end) range of the functions of a file id."""
+        return (int(np.searchsorted(self.func_file, file_id, side="left")),
+                int(np.searchsorted(self.func_file, file_id, side="right")))
+
+    def site_range(self, file_id):
+        """Return the (start, end) range of the call sites of a file id."""
+        return (int(np.searchsorted(self.site_file, file_id, side="left")),
+                int(np.searchsorted(self.site_file, file_id, side="right")))
@@ -16,14 +16,19 @@ fi
 
 rm -f file_analysis_* || true
 rm -f merged.json || true
-rm -f function_analysis_output.json || true
+rm -f function_analysis_* || true
 rm -f bb_info.json || true
+rm -f bb_info.ndjson || true
 rm -f cg_data.json || true
+rm -rf callgraph.index || true
 
-"${LKF_BASE_PATH}/scripts/find-memory-related-ops.py" --kmalloc --dir "${bcfiles_dir}" 
+# Parse the callgraph JSON files once; the scripts below read this index instead
+"${LKF_BASE_PATH}/scripts/index-callgraph.py" "${bcfiles_dir}" -o callgraph.index
 
-"${LKF_BASE_PATH}/IRAnalyzer/build/iranalyzer" @bc.list
+"${LKF_BASE_PATH}/scripts/find-memory-related-ops.py" --kmalloc --dir callgraph.index
+
+"${LKF_BASE_PATH}/IRAnalyzer/build/iranalyzer" -ndjson -j "$(nproc)" @bc.list
 
 "${LKF_BASE_PATH}/scripts/merge-data.py" \
-  --bcfiles-dir "${bcfiles_dir}" \
-  --bb-info-json "${LKF_BASE_PATH}/bb_info.json"
\ No newline at end of file
+  --bcfiles-dir callgraph.index \
+  --bb-info-json "${LKF_BASE_PATH}/bb_info.ndjson"
\ No newline at end of file
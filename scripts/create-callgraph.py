@@ -5,32 +5,102 @@ from networkx.readwrite import json_graph
 import matplotlib.pyplot as plt
 import json
 import sys
-import glob
 import os
 import pickle
-
-def save_graph(graph, output_path_file_name):
-    """Save the graph in Pickle format."""
+import argparse
+import importlib.util
+import time
+
+from graph_store import save_graph_store
+from callgraph_index import CallgraphIndex, is_callgraph_index, build_callgraph_edges, find_callgraph_files
+
+def write_ndjson_graph(graph, output_file, chunk_size=10000):
+    """
+    Write the graph as newline-delimited JSON: one {"id": ...} line per node followed by
+    one {"source": ..., "target": ...} line per edge. Lines are written in chunks so the
+    whole node-link document is never built in memory.
+    """
+    with open(output_file, "w") as f:
+        chunk = []
+        for node in graph.nodes():
+            chunk.append(json.dumps({"id": node}) + "\n")
+            if len(chunk) >= chunk_size:
+                f.writelines(chunk)
+                chunk = []
+        for source, target in graph.edges():
+            chunk.append(json.dumps({"source": source, "target": target}) + "\n")
+            if len(chunk) >= chunk_size:
+                f.writelines(chunk)
+                chunk = []
+        f.writelines(chunk)
+
+def save_graph(graph, output_path_file_name, json_format="none"):
+    """Save the graph in Pickle format, and optionally as JSON."""
     try:
         # Save as Pickle
         with open(output_path_file_name + ".pkl", 'wb') as f:
             pickle.dump(graph, f)
 
-        data = json_graph.node_link_data(graph)
-        with open(output_path_file_name + ".json", "w") as f:
-            json.dump(data, f, indent=4)
-
-        print(f"Graph saved as Pickle and JSON")
+        if json_format == "node-link":
+            data = json_graph.node_link_data(graph)
+            with open(output_path_file_name + ".json", "w") as f:
+                json.dump(data, f, indent=4)
+            print(f"Graph saved as Pickle and JSON")
+        elif json_format == "ndjson":
+            write_ndjson_graph(graph, output_path_file_name + ".ndjson")
+            print("Graph saved as Pickle and NDJSON")
+        else:
+            print("Graph saved as Pickle")
     except Exception as e:
         print(f"Error saving the graph: {e}")
 
+def ingest_callgraph_files(json_files, max_workers, stream):
+    """
+    Parse callgraph JSON files in a process pool and return their call edges.
+    Returns (node names, caller ids, callee ids) with edges deduplicated.
+    """
+    start = time.perf_counter()
+    names, callers, callees, records = build_callgraph_edges(json_files, max_workers, stream)
+
+    elapsed = time.perf_counter() - start
+    rate = records / elapsed if elapsed > 0 else 0.0
+    print(f"[+]Ingested {records} call records from {len(json_files)} files "
+          f"({len(names)} functions, {len(callers)} unique edges) in {elapsed:.2f}s: {rate:.0f} edges/s")
+
+    return names, callers, callees
+
+def ingest_callgraph_index(index_directory):
+    """
+    Read the call edges from a callgraph index (index-callgraph.py output) instead of the JSON files.
+    Returns (node names, caller ids, callee ids) with edges deduplicated.
+    """
+    start = time.perf_counter()
+    index = CallgraphIndex.load(index_directory)
+    callers, callees = index.unique_edges()
+
+    elapsed = time.perf_counter() - start
+    print(f"[+]Read {index.number_of_records()} call records from {index_directory} "
+          f"({len(index.names)} functions, {len(callers)} unique edges) in {elapsed:.2f}s")
+
+    return index.names, callers, callees
+
+def parse_options():
+    parser = argparse.ArgumentParser(description="Create a unified call graph from DeepType callgraph JSON files.")
+    parser.add_argument("directory_path", help="bcfiles directory, or a callgraph index written by index-callgraph.py",
+                        metavar="BCFILES_DIR")
+    parser.add_argument("output_directory", help="Output directory", metavar="OUTPUT_DIR")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--stream", action="store_true",
+                        help="Parse JSON files incrementally with ijson (for very large per-module files)")
+    parser.add_argument("--json", choices=["none", "node-link", "ndjson"], default="none",
+                        help="Also export the graph as JSON: indented node-link document or streamed NDJSON")
+    return parser.parse_args()
+
 def main():
-    if len(sys.argv) != 3:
-        print(f"Usage: {sys.argv[0]} <bcfiles directory> <output_directory>")
-        sys.exit(1)
-    
-    directory_path = sys.argv[1]
-    output_directory = sys.argv[2]
+    args = parse_options()
+
+    directory_path = args.directory_path
+    output_directory = args.output_directory
 
     if not os.path.isdir(directory_path):
         print(f"Error: {directory_path} is not a valid directory.")
@@ -40,27 +110,26 @@ def main():
         print(f"Error: {output_directory} is not a valid directory.")
         sys.exit(1)
 
-    # Find all JSON files in the directory and its subdirectories
-    json_files = glob.glob(os.path.join(directory_path, '**', 'callgraph-*.json'), recursive=True)
-
-    if not json_files:
-        print(f"No JSON files found in the directory: {directory_path}")
+    if args.stream and importlib.util.find_spec("ijson") is None:
+        print("Error: --stream requires the ijson module.")
         sys.exit(1)
 
-    # Create a unified directed graph
-    unified_call_graph = nx.DiGraph()
+    if is_callgraph_index(directory_path):
+        names, callers, callees = ingest_callgraph_index(directory_path)
+    else:
+        # Find all JSON files in the directory and its subdirectories
+        json_files = find_callgraph_files(directory_path)
 
-    for json_file in json_files:
-        try:
-            with open(json_file, 'r') as f:
-                call_data = json.load(f)
-            for data in call_data:
-                caller = data['CallerName']
-                callee = data['CalleeName']
+        if not json_files:
+            print(f"No JSON files found in the directory: {directory_path}")
+            sys.exit(1)
 
-                unified_call_graph.add_edge(caller, callee)
-        except Exception as e:
-            print(f"Error processing file {json_file}: {e}")
+        names, callers, callees = ingest_callgraph_files(json_files, args.jobs, args.stream)
+
+    # Create a unified directed graph in one bulk build
+    unified_call_graph = nx.DiGraph()
+    unified_call_graph.add_nodes_from(names)
+    unified_call_graph.add_edges_from((names[u], names[v]) for u, v in zip(callers.tolist(), callees.tolist()))
 
     # Output graph information
     #print(f"Nodes: {unified_call_graph.nodes()}")
@@ -68,7 +137,12 @@ def main():
 
     # Save the graph in Pickle format
     output_path_pickle = os.path.join(output_directory, "unified_call_graph.pkl")
-    save_graph(unified_call_graph, output_path_pickle)
+    save_graph(unified_call_graph, output_path_pickle, args.json)
+
+    # Save the memory-mappable CSR store used by find-path.py --store
+    output_path_store = os.path.join(output_directory, "unified_call_graph.store")
+    save_graph_store(output_path_store, names, callers, callees)
+    print(f"Graph store saved to {output_path_store}")
 
     # Visualize the unified graph
     # plt.figure(figsize=(12, 8))
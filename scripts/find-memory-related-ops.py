@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
 
 import sys
-import glob
 import os
 import json
-import re
 import argparse
+import time
+import yaml
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
-import pprint
+from callgraph_index import CallgraphIndex, is_callgraph_index, find_callgraph_files, bc_filename_of
 
 KERNEL_MEMORY_ALLOC_OPERATIONS = [
     "__kmalloc",
@@ -30,89 +33,157 @@ LIBC_MEMORY_FREE_OPERATIONS = [
     "free",
 ]
 
-MEMORY_OPERATIONS = None
+def load_memory_operations(config_file):
+    """
+    Load allocator and free function families from a YAML (or JSON) file of the form
+      alloc: [krealloc, kvmalloc, kmem_cache_alloc]
+      free: [vfree, kvfree, kmem_cache_free]
+    """
+    with open(config_file) as f:
+        config = yaml.safe_load(f) or {}
+    return config.get("alloc") or [], config.get("free") or []
+
+def scan_callgraph_file(json_file, alloc_operations, free_operations):
+    """
+    Collect the alloc/free calls of every caller in one callgraph JSON file.
+    Returns (json_file, {caller: {"alloc": [...] or None, "free": [...] or None}}, error).
+    Callers without any memory operation are left out.
+    """
+    try:
+        with open(json_file) as f:
+            data = json.load(f)
+    except Exception as e:
+        return json_file, {}, str(e)
+
+    callers = {}
+    for d in data or []:
+        callee = d["CalleeName"]
+        if callee in alloc_operations:
+            kind = "alloc"
+        elif callee in free_operations:
+            kind = "free"
+        else:
+            continue
 
-def main(directory_path):
+        ops = callers.get(d["CallerName"])
+        if ops is None:
+            ops = callers[d["CallerName"]] = {"alloc": None, "free": None}
+        if ops[kind] is None:
+            ops[kind] = [callee]
+        else:
+            ops[kind].append(callee)
+
+    return json_file, callers, None
+
+def scan_callgraph_index(index, alloc_operations, free_operations):
+    """
+    Same result as scan_callgraph_file() over every file, read from a callgraph index.
+    Returns {bc file: {caller: {"alloc": [...] or None, "free": [...] or None}}}.
+    """
+    callee = np.asarray(index.callee)
+    is_alloc = np.isin(callee, index.name_ids(alloc_operations))
+    is_free = np.isin(callee, index.name_ids(free_operations)) & ~is_alloc
+    rows = np.flatnonzero(is_alloc | is_free)
+
+    all_data = {}
+    names = index.names
+    files = index.files
+    for file_id, caller, callee_id, alloc in zip(np.asarray(index.file)[rows].tolist(),
+                                                 np.asarray(index.caller)[rows].tolist(),
+                                                 callee[rows].tolist(), is_alloc[rows].tolist()):
+        callers = all_data.setdefault(files[file_id], {})
+        ops = callers.get(names[caller])
+        if ops is None:
+            ops = callers[names[caller]] = {"alloc": None, "free": None}
+        kind = "alloc" if alloc else "free"
+        if ops[kind] is None:
+            ops[kind] = [names[callee_id]]
+        else:
+            ops[kind].append(names[callee_id])
+
+    return all_data
+
+def main(directory_path, alloc_operations, free_operations, max_workers):
     if not os.path.isdir(directory_path):
         print(f"Error: {directory_path} is not a valid directory.")
         sys.exit(1)
 
-    restr = r"-(.*?)[.]"
-    paths = directory_path.split("/")
-    idx = paths.index("bcfiles") + 1
-    paths = "/".join(paths[idx:])
-
     all_data = {}
 
-    json_files = glob.glob(os.path.join(directory_path, '**', 'callgraph-*.json'), recursive=True)
-    for j in json_files:
-        tmp = j.split("/")
-        paths = "/".join(tmp[idx:len(tmp) -1])
-        bc_filename = os.path.abspath(directory_path + paths + "/" + re.search(restr, os.path.basename(j)).group(1) + ".bc")
-        
-        with open(j) as f:
-            data = json.load(f)
-
-        if not data:
-            continue
-
-        all_data[bc_filename] = {}
-
-        for d in data:
-            caller = d["CallerName"]
-            callee = d["CalleeName"]
-
-            if not caller in all_data[bc_filename]:
-                all_data[bc_filename][caller] = {
-                    "alloc": None,
-                    "free": None,
-                }
-
-            if callee in MEMORY_ALLOC_OPERATIONS:
-                if all_data[bc_filename][caller]["alloc"] is None:
-                    all_data[bc_filename][caller]["alloc"] = [callee]
-                else:
-                    all_data[bc_filename][caller]["alloc"].append(callee)
-            elif callee in MEMORY_FREE_OPERATION:
-                if all_data[bc_filename][caller]["free"] is None:
-                    all_data[bc_filename][caller]["free"] = [callee]
-                else:
-                    all_data[bc_filename][caller]["free"].append(callee)
-
-            if not all_data[bc_filename][caller]["alloc"] and not all_data[bc_filename][caller]["free"]:
-                del all_data[bc_filename][caller]
-
-        # remove empty data
-        if not all_data[bc_filename]:
-            del all_data[bc_filename]
-                
+    if is_callgraph_index(directory_path):
+        # The JSON files were already parsed by index-callgraph.py
+        start = time.perf_counter()
+        index = CallgraphIndex.load(directory_path)
+        json_files = index.files
+        find_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        all_data = scan_callgraph_index(index, alloc_operations, free_operations)
+        scan_time = time.perf_counter() - start
+        max_workers = 1
+    else:
+        start = time.perf_counter()
+        json_files = find_callgraph_files(directory_path)
+        find_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scan = partial(scan_callgraph_file, alloc_operations=frozenset(alloc_operations),
+                       free_operations=frozenset(free_operations))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for json_file, callers, error in executor.map(scan, json_files, chunksize=16):
+                if error:
+                    print(f"[-]Error processing file {json_file}: {error}")
+                    continue
+                # remove empty data
+                if callers:
+                    all_data[bc_filename_of(json_file, directory_path)] = callers
+        scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
     with open("memory_ops.json", "w") as f:
         json.dump(all_data, f, indent=4)
+    write_time = time.perf_counter() - start
 
     print("[+]Parse result was written to memory_ops.json")
+    print(f"[+]Find: {len(json_files)} files in {find_time:.2f}s")
+    print(f"[+]Scan: {len(all_data)} files with memory operations in {scan_time:.2f}s ({max_workers} workers)")
+    print(f"[+]Write: {write_time:.2f}s")
 
 def parse_options():
     parser = argparse.ArgumentParser()
     parser.add_argument("--kmalloc", help="check kmalloc related operations", action="store_true")
     parser.add_argument("--malloc", help="check malloc related operations", action="store_true")
-    parser.add_argument("--dir", help="Path to callgraph json file director",
+    parser.add_argument("--config", help="YAML file with additional 'alloc' and 'free' function lists",
+        metavar="FILE")
+    parser.add_argument("--dir", help="Path to callgraph json file director, or a callgraph index written by index-callgraph.py",
         metavar="DIRECTORY", required=True)
-    
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of worker processes")
+
     args = parser.parse_args()
     if args.kmalloc and args.malloc:
         print("[-]You can only choose one of kmalloc or malloc")
         sys.exit(1)
-    
+    if not (args.kmalloc or args.malloc or args.config):
+        print("[-]Choose kmalloc or malloc, or give a --config file")
+        sys.exit(1)
+
     return args
 
 if __name__ == "__main__":
 
     args = parse_options()
+    alloc_operations = []
+    free_operations = []
     if args.kmalloc:
-        MEMORY_ALLOC_OPERATIONS = KERNEL_MEMORY_ALLOC_OPERATIONS
-        MEMORY_FREE_OPERATION = KERNEL_MEMORY_FREE_OPERATIONS
+        alloc_operations = KERNEL_MEMORY_ALLOC_OPERATIONS
+        free_operations = KERNEL_MEMORY_FREE_OPERATIONS
     elif args.malloc:
-        MEMORY_ALLOC_OPERATIONS = LIBC_MEMORY_ALLOC_OPERATIONS
-        MEMORY_FREE_OPERATION = LIBC_MEMORY_FREE_OPERATIONS
+        alloc_operations = LIBC_MEMORY_ALLOC_OPERATIONS
+        free_operations = LIBC_MEMORY_FREE_OPERATIONS
+
+    if args.config:
+        extra_alloc, extra_free = load_memory_operations(args.config)
+        alloc_operations = alloc_operations + extra_alloc
+        free_operations = free_operations + extra_free
 
-    main(args.dir)
\ No newline at end of file
+    main(args.dir, alloc_operations, free_operations, args.jobs)
@@ -2,44 +2,125 @@
 
 import pickle
 import sys
-import networkx as nx
 import argparse
 import yaml
+import numpy as np
+import os
+import array
+import time
+import multiprocessing
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def find_shortest_paths(graph, target, max_paths):
-    """Find shortest paths leading to the target node using BFS."""
+from graph_store import GraphStore
+from syscall_index import SyscallIndex, build_syscall_index, find_syscall_entries, reachable_mask
+
+DEFAULT_MAX_FRONTIER = 1000000
+
+def build_path(entry, nodes, parents):
+    """Follow parent pointers from a search entry back to the target (target-to-source order)."""
+    path = []
+    while entry >= 0:
+        path.append(nodes[entry])
+        entry = parents[entry]
+    return path[::-1]
+
+def find_shortest_paths(graph, target, max_paths, max_depth=None, timeout=None, max_frontier=DEFAULT_MAX_FRONTIER,
+                        roots=None, reachable=None):
+    """Find shortest paths leading to the target node using BFS over the reverse graph.
+    graph is a GraphStore and paths are lists of node ids.
+
+    If roots (a boolean mask of e.g. syscall entries) is given, paths end at a root node instead of
+    at a function without callers, and reachable (a boolean mask) restricts the search to nodes
+    that can be reached from a root.
+
+    Paths are stored as parent pointers (one node id and one parent entry per step) instead of
+    copied lists. BFS pops paths in order of length, so the result is the k shortest simple
+    paths from a root (a function without callers) to the target."""
     paths = []
-    queue = deque([(target, [target])])  # Queue holds (current_node, path_to_current_node)
-    path_count = 0
+    nodes = array.array('i', [target])   # Search entry -> node id
+    parents = array.array('i', [-1])     # Search entry -> parent search entry
+    depths = array.array('i', [0])       # Search entry -> path length
+    queue = deque([0])
+    deadline = time.monotonic() + timeout if timeout else None
+    frontier_full = False
 
-    while queue and path_count < max_paths:
-        current, path = queue.popleft()
+    while queue and len(paths) < max_paths:
+        if deadline and time.monotonic() > deadline:
+            print(f"Timeout ({timeout}s) reached. Stopping exploration.")
+            break
+
+        entry = queue.popleft()
+        current = nodes[entry]
+        predecessors = graph.predecessors(current)
 
         # If we've reached a source node, add the path
-        if graph.in_degree(current) == 0:
-            paths.append(path)  # Keep the order as target-to-source
-            path_count += 1
-            if path_count >= max_paths:
+        if (roots[current] if roots is not None else len(predecessors) == 0):
+            paths.append(build_path(entry, nodes, parents))  # Keep the order as target-to-source
+            if len(paths) >= max_paths:
                 print(f"Path limit ({max_paths}) reached. Stopping exploration.")
                 break
+            continue
+
+        if max_depth is not None and depths[entry] >= max_depth:
+            continue
+
+        # Nodes on the current path, for O(1) cycle checks
+        on_path = set()
+        e = entry
+        while e >= 0:
+            on_path.add(nodes[e])
+            e = parents[e]
 
         # Add predecessors to the queue
-        for predecessor in graph.predecessors(current):
-            if predecessor not in path:  # Avoid cycles
-                queue.append((predecessor, path + [predecessor]))
-    
+        depth = depths[entry] + 1
+        for predecessor in predecessors.tolist():
+            if predecessor in on_path:  # Avoid cycles
+                continue
+            if reachable is not None and not reachable[predecessor]:
+                continue
+            if len(queue) >= max_frontier:
+                frontier_full = True
+                break
+            nodes.append(predecessor)
+            parents.append(entry)
+            depths.append(depth)
+            queue.append(len(nodes) - 1)
+
+    if frontier_full:
+        print(f"Frontier limit ({max_frontier}) reached. Some longer paths were not explored.")
+
     return paths
 
 def parse_options():
     parser = argparse.ArgumentParser(description="Find paths in a call graph.")
-    parser.add_argument("--picklefile", help="Pickle file path", metavar="PICKLEFILE", required=True)
-    parser.add_argument("--func", help="Target function name", metavar="FUNCTION", required=True)
+    graph_source = parser.add_mutually_exclusive_group(required=True)
+    graph_source.add_argument("--picklefile", help="Pickle file path", metavar="PICKLEFILE")
+    graph_source.add_argument("--store", help="Graph store directory written by create-callgraph.py", metavar="STORE")
+    targets = parser.add_mutually_exclusive_group()
+    targets.add_argument("--func", help="Target function name", metavar="FUNCTION")
+    targets.add_argument("--funcs-file", metavar="FILE",
+                         help="Batch mode: file with target functions (one per line, YAML list, or patch-analyze.py output)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of worker processes in batch mode")
     parser.add_argument("--output", default="paths_output.yml", help="Output file path")
     parser.add_argument("--verbose", help="Show all results (including non-syscall paths)", action="store_true")
+    parser.add_argument("--syscall-index", metavar="DIRECTORY",
+                        help="Syscall reachability index directory (default: <store>/syscall_index)")
+    parser.add_argument("--build-syscall-index", action="store_true",
+                        help="Build and save the syscall reachability index, then exit (no target function needed)")
+    parser.add_argument("--syscalls", action="store_true",
+                        help="Report which syscalls reach the function and at what minimum depth instead of paths")
     parser.add_argument("--max-paths", type=int, default=20, help="Maximum number of paths to find")
+    parser.add_argument("--max-depth", type=int, default=None, help="Maximum path length (number of calls)")
+    parser.add_argument("--timeout", type=float, default=None, help="Stop searching after this many seconds")
+    parser.add_argument("--max-frontier", type=int, default=DEFAULT_MAX_FRONTIER,
+                        help="Maximum number of partial paths kept in the search queue")
+
+    args = parser.parse_args()
+    if not (args.func or args.funcs_file or args.build_syscall_index):
+        parser.error("one of the arguments --func --funcs-file is required")
 
-    return parser.parse_args()
+    return args
 
 def load_graph_from_pickle(pickle_file_path):
     try:
@@ -49,20 +130,164 @@ def load_graph_from_pickle(pickle_file_path):
         print(f"Error loading Pickle file: {e}")
         sys.exit(1)
 
+def load_graph(args):
+    """Load the call graph as a GraphStore, from a store directory or a networkx pickle."""
+    if args.store:
+        try:
+            return GraphStore.load(args.store)
+        except Exception as e:
+            print(f"Error loading graph store: {e}")
+            sys.exit(1)
+    return GraphStore.from_networkx(load_graph_from_pickle(args.picklefile))
+
+def load_target_functions(funcs_file):
+    """Read target function names from a plain list, a YAML list or patch-analyze.py output."""
+    with open(funcs_file, 'r') as f:
+        data = yaml.safe_load(f)
+
+    functions = []
+    if isinstance(data, dict):
+        # patch-analyze.py output: {patch: {"modified_functions": {"added": {...}, "removed": {...}, "modified": {...}}}}
+        for patch in data.values():
+            for changed in patch.get("modified_functions", {}).values():
+                functions.extend(changed.keys())
+    elif isinstance(data, list):
+        functions = [str(f) for f in data]
+    elif isinstance(data, str):
+        functions = data.split()
+
+    # Keep the order, drop duplicates and patch-analyze.py placeholders
+    return [f for f in dict.fromkeys(functions) if f != "OutOfFunctionScope"]
+
+# Read-only graph and syscall masks shared with the batch workers (inherited through fork)
+shared_graph = None
+shared_roots = None
+shared_reachable = None
+
+def find_paths_worker(func, target, max_paths, max_depth, timeout, max_frontier):
+    """Run one query against the shared graph and return (func, paths as source-to-target names)."""
+    paths = find_shortest_paths(shared_graph, target, max_paths, max_depth, timeout, max_frontier,
+                                shared_roots, shared_reachable)
+    return func, [[shared_graph.name(node) for node in reversed(path)] for path in paths]
+
+def run_batch(call_graph, functions, args, roots, reachable):
+    """Find paths for many target functions with one graph load and a pool of worker processes."""
+    global shared_graph, shared_roots, shared_reachable
+    shared_graph = call_graph
+    shared_roots = roots
+    shared_reachable = reachable
+
+    results = {}
+    start = time.perf_counter()
+
+    # Resolve the targets before forking, so the name index is built once and shared copy-on-write
+    targets = {}
+    for func in functions:
+        target = call_graph.node_id(func)
+        if target is None:
+            print(f"Function '{func}' not found in the graph.")
+            results[func] = []
+        else:
+            targets[func] = target
+
+    with ProcessPoolExecutor(max_workers=args.jobs, mp_context=multiprocessing.get_context("fork")) as executor:
+        futures = [executor.submit(find_paths_worker, func, target, args.max_paths, args.max_depth, args.timeout,
+                                   args.max_frontier)
+                   for func, target in targets.items()]
+        for future in as_completed(futures):
+            func, paths = future.result()
+            print(f"{len(paths)} paths found to '{func}'.")
+            results[func] = paths
+
+    # Write the results in the order of the input list
+    with open(args.output, "w") as f:
+        yaml.dump({func: results[func] for func in functions}, f, sort_keys=False)
+
+    print(f"[+]{len(functions)} functions processed in {time.perf_counter() - start:.2f}s. Results written to {args.output}")
+
+def syscall_masks(call_graph, syscall_index, verbose):
+    """
+    Return (roots, reachable) masks restricting the search to paths from syscall entries,
+    or (None, None) to report every path (--verbose, or no syscall entries in the graph).
+    """
+    if verbose:
+        return None, None
+
+    if syscall_index is not None:
+        return syscall_index.entry_mask(call_graph.number_of_nodes()), syscall_index.reachable_mask()
+
+    entries = find_syscall_entries(call_graph)
+    if len(entries) == 0:
+        print("No syscall entry functions found in the graph. Showing all paths.")
+        return None, None
+
+    roots = np.zeros(call_graph.number_of_nodes(), dtype=bool)
+    roots[entries] = True
+    return roots, reachable_mask(call_graph, entries)
+
+def report_syscalls(call_graph, syscall_index, args):
+    """Write which syscalls reach the target function(s) and at what minimum depth."""
+    if syscall_index is None:
+        syscall_index = build_syscall_index(call_graph)
+
+    functions = load_target_functions(args.funcs_file) if args.funcs_file else [args.func]
+    results = {}
+    for func in functions:
+        node = call_graph.node_id(func)
+        if node is None:
+            print(f"Function '{func}' not found in the graph.")
+            results[func] = {}
+            continue
+        results[func] = dict(syscall_index.reaching_syscalls(node))
+        print(f"{len(results[func])} syscalls reach '{func}' (minimum depth: {syscall_index.min_depth(node)})")
+
+    with open(args.output, "w") as f:
+        yaml.dump(results, f, sort_keys=False)
+
 def main():
     args = parse_options()
     
-    call_graph = load_graph_from_pickle(args.picklefile)
+    call_graph = load_graph(args)
+
+    index_directory = args.syscall_index or (os.path.join(args.store, "syscall_index") if args.store else None)
+    if args.build_syscall_index:
+        if not index_directory:
+            print("--build-syscall-index needs --store or --syscall-index")
+            sys.exit(1)
+        build_syscall_index(call_graph).save(index_directory)
+        print(f"Syscall index saved to {index_directory}")
+        return
+
+    syscall_index = None
+    if index_directory and os.path.isdir(index_directory):
+        syscall_index = SyscallIndex.load(index_directory)
+        if not syscall_index.matches(call_graph):
+            # The graph was rebuilt after the index, so its node ids no longer line up
+            print(f"Syscall index {index_directory} does not match the graph. Rebuilding it.")
+            syscall_index = build_syscall_index(call_graph)
+            syscall_index.save(index_directory)
+
+    if args.syscalls:
+        report_syscalls(call_graph, syscall_index, args)
+        return
+
+    roots, reachable = syscall_masks(call_graph, syscall_index, args.verbose)
+
+    if args.funcs_file:
+        run_batch(call_graph, load_target_functions(args.funcs_file), args, roots, reachable)
+        return
     
-    if args.func not in call_graph.nodes:
+    target = call_graph.node_id(args.func)
+    if target is None:
         print(f"Function '{args.func}' not found in the graph.")
         sys.exit(1)
 
-    paths = find_shortest_paths(call_graph, args.func, args.max_paths)
+    paths = find_shortest_paths(call_graph, target, args.max_paths, args.max_depth, args.timeout, args.max_frontier,
+                                roots, reachable)
     
     if paths:
         print(f"Paths to '{args.func}':")
-        paths_arr = [path[::-1] for path in paths]
+        paths_arr = [[call_graph.name(node) for node in reversed(path)] for path in paths]
         for path in paths_arr:
             print(" -> ".join(path))
         
@@ -0,0 +1,192 @@
+"""
+Memory-mappable graph store for call graphs and CFGs.
+
+A store is a directory containing:
+  names.txt                          node names, one per line (node id = line number)
+  labels.txt                         optional node labels, one per line, in the same order
+  fwd_indptr.npy, fwd_indices.npy    int32 CSR arrays of successors
+  rev_indptr.npy, rev_indices.npy    int32 CSR arrays of predecessors
+
+The .npy arrays are opened with mmap_mode='r', so loading a store only reads
+the string table; adjacency pages are faulted in as queries touch them.
+Parallel edges are collapsed.
+
+Subdirectories hold data derived from the store (e.g. syscall_index/) and are
+removed when the store is rewritten.
+"""
+import os
+import shutil
+import hashlib
+import numpy as np
+
+def build_csr(num_nodes, src, dst):
+    """
+    Build deduplicated CSR (indptr, indices) arrays from edge source and destination ids.
+    """
+    src = np.asarray(src, dtype=np.int32)
+    dst = np.asarray(dst, dtype=np.int32)
+
+    order = np.lexsort((dst, src))
+    src = src[order]
+    dst = dst[order]
+    if len(src):
+        keep = np.ones(len(src), dtype=bool)
+        keep[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        src = src[keep]
+        dst = dst[keep]
+
+    indptr = np.zeros(num_nodes + 1, dtype=np.int32)
+    np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+    return indptr, dst
+
+def write_lines(filename, lines):
+    with open(filename, "w") as f:
+        for line in lines:
+            f.write(f"{line}\n")
+
+def read_lines(filename):
+    with open(filename, "r") as f:
+        return f.read().splitlines()
+
+def names_digest(names):
+    """Return a hex digest of a node name list; it identifies the node ids of a store."""
+    digest = hashlib.sha256()
+    for name in names:
+        digest.update(f"{name}\n".encode())
+    return digest.hexdigest()
+
+def save_graph_store(directory, names, src, dst, labels=None):
+    """
+    Save a graph given as a node name list and edge id arrays.
+    Data derived from an earlier store in the same directory is removed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    num_nodes = len(names)
+
+    # Derived data (e.g. syscall_index/) refers to the old node ids
+    for entry in os.scandir(directory):
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path)
+
+    write_lines(os.path.join(directory, "names.txt"), names)
+    labels_file = os.path.join(directory, "labels.txt")
+    if labels is not None:
+        write_lines(labels_file, labels)
+    elif os.path.isfile(labels_file):
+        os.remove(labels_file)
+
+    indptr, indices = build_csr(num_nodes, src, dst)
+    np.save(os.path.join(directory, "fwd_indptr.npy"), indptr)
+    np.save(os.path.join(directory, "fwd_indices.npy"), indices)
+
+    indptr, indices = build_csr(num_nodes, dst, src)
+    np.save(os.path.join(directory, "rev_indptr.npy"), indptr)
+    np.save(os.path.join(directory, "rev_indices.npy"), indices)
+
+def networkx_to_arrays(graph):
+    """
+    Return (names, src, dst, labels) for a networkx graph. labels is None if no node has a label.
+    """
+    names = list(graph.nodes())
+    index = {name: i for i, name in enumerate(names)}
+    src = np.fromiter((index[u] for u, v in graph.edges()), dtype=np.int32, count=graph.number_of_edges())
+    dst = np.fromiter((index[v] for u, v in graph.edges()), dtype=np.int32, count=graph.number_of_edges())
+
+    labels = None
+    if any("label" in data for _, data in graph.nodes(data=True)):
+        labels = [data.get("label", "") for _, data in graph.nodes(data=True)]
+    return [str(name) for name in names], src, dst, labels
+
+def save_networkx_graph_store(directory, graph):
+    """
+    Save a networkx graph as a graph store.
+    """
+    names, src, dst, labels = networkx_to_arrays(graph)
+    save_graph_store(directory, names, src, dst, labels)
+
+def is_graph_store(path):
+    return os.path.isfile(os.path.join(path, "names.txt"))
+
+class GraphStore:
+    """
+    Read-only CSR view of a graph. Nodes are referred to by integer id; use node_id()/name() to convert.
+    """
+    def __init__(self, names, fwd_indptr, fwd_indices, rev_indptr, rev_indices, labels=None):
+        self.names = names
+        self.labels = labels
+        self.fwd_indptr = fwd_indptr
+        self.fwd_indices = fwd_indices
+        self.rev_indptr = rev_indptr
+        self.rev_indices = rev_indices
+        self._index = None
+
+    @classmethod
+    def load(cls, directory):
+        """Open a store directory; adjacency arrays are memory-mapped."""
+        def load_array(name):
+            return np.load(os.path.join(directory, name), mmap_mode="r")
+
+        labels_file = os.path.join(directory, "labels.txt")
+        labels = read_lines(labels_file) if os.path.isfile(labels_file) else None
+        return cls(read_lines(os.path.join(directory, "names.txt")),
+                   load_array("fwd_indptr.npy"), load_array("fwd_indices.npy"),
+                   load_array("rev_indptr.npy"), load_array("rev_indices.npy"),
+                   labels)
+
+    @classmethod
+    def from_arrays(cls, names, src, dst, labels=None):
+        """Build an in-memory store from a node name list and edge id arrays."""
+        fwd_indptr, fwd_indices = build_csr(len(names), src, dst)
+        rev_indptr, rev_indices = build_csr(len(names), dst, src)
+        return cls(names, fwd_indptr, fwd_indices, rev_indptr, rev_indices, labels)
+
+    @classmethod
+    def from_networkx(cls, graph):
+        """Build an in-memory store from a networkx graph."""
+        return cls.from_arrays(*networkx_to_arrays(graph))
+
+    def number_of_nodes(self):
+        return len(self.names)
+
+    def number_of_edges(self):
+        return len(self.fwd_indices)
+
+    def node_id(self, name):
+        """Return the id of a node name, or None if it is not in the graph."""
+        if self._index is None:
+            self._index = {n: i for i, n in enumerate(self.names)}
+        return self._index.get(name)
+
+    def __contains__(self, name):
+        return self.node_id(name) is not None
+
+    def name(self, node):
+        return self.names[node]
+
+    def successors(self, node):
+        return self.fwd_indices[self.fwd_indptr[node]:self.fwd_indptr[node + 1]]
+
+    def predecessors(self, node):
+        return self.rev_indices[self.rev_indptr[node]:self.rev_indptr[node + 1]]
+
+    def out_degree(self, node):
+        return int(self.fwd_indptr[node + 1] - self.fwd_indptr[node])
+
+    def in_degree(self, node):
+        return int(self.rev_indptr[node + 1] - self.rev_indptr[node])
+
+    def to_networkx(self):
+        """Build a networkx DiGraph (nodes carry 'label' if the store has labels)."""
+        import networkx as nx
+
+        graph = nx.DiGraph()
+        if self.labels is not None:
+            graph.add_nodes_from((name, {"label": label}) for name, label in zip(self.names, self.labels))
+        else:
+            graph.add_nodes_from(self.names)
+
+        names = self.names
+        indptr = np.asarray(self.fwd_indptr)
+        src = np.repeat(np.arange(len(names), dtype=np.int32), np.diff(indptr))
+        graph.add_edges_from((names[u], names[v]) for u, v in zip(src.tolist(), np.asarray(self.fwd_indices).tolist()))
+        return graph
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import argparse
+import time
+
+from callgraph_index import build_callgraph_index, find_callgraph_files
+
+def parse_options():
+    parser = argparse.ArgumentParser(description="Parse the DeepType callgraph JSON files once into a columnar index "
+                                                 "read by create-callgraph.py, find-memory-related-ops.py and merge-data.py.")
+    parser.add_argument("directory_path", help="bcfiles directory", metavar="BCFILES_DIR")
+    parser.add_argument("-o", "--output", default="callgraph.index", help="Output index directory", metavar="INDEX_DIR")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--stream", action="store_true",
+                        help="Parse JSON files incrementally with ijson (for very large per-module files)")
+    return parser.parse_args()
+
+def main():
+    args = parse_options()
+
+    if not os.path.isdir(args.directory_path):
+        print(f"Error: {args.directory_path} is not a valid directory.")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    json_files = find_callgraph_files(args.directory_path)
+    if not json_files:
+        print(f"No JSON files found in the directory: {args.directory_path}")
+        sys.exit(1)
+
+    index = build_callgraph_index(args.directory_path, args.jobs, args.stream, json_files)
+    index.save(args.output)
+    elapsed = time.perf_counter() - start
+
+    print(f"[+]Indexed {index.number_of_records()} call records from {len(json_files)} files "
+          f"({len(index.names)} functions) in {elapsed:.2f}s ({args.jobs} workers)")
+    print(f"[+]Index saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
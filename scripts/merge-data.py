@@ -6,6 +6,10 @@ import os
 import glob
 import json
 import re
+import numpy as np
+
+from callgraph_index import CallgraphIndex, is_callgraph_index, build_callgraph_index
+from callgraph_stats import CallSiteStats
 
 import pprint
 
@@ -57,7 +61,44 @@ def merge_data_by_function(cg_data, bb_info):
 
     return merged
 
+class BBInfoNDJSON:
+    """
+    Module lookups in a bb_info.ndjson file written by iranalyzer -ndjson.
+    Only the byte offset of each module's line is kept in memory; the functions of a
+    module are parsed when the module is looked up, so bb info is joined one module at a time.
+    """
+    MODULE_PREFIX = b'{"Module":'
+
+    def __init__(self, bb_info_ndjson):
+        self.f = open(bb_info_ndjson, "rb")
+        self.offsets = {}
+        self.cached = (None, None)
+
+        decoder = json.JSONDecoder()
+        offset = 0
+        for line in self.f:
+            if line.startswith(self.MODULE_PREFIX):
+                module, _ = decoder.raw_decode(line.decode("utf-8"), len(self.MODULE_PREFIX))
+                self.offsets[module] = offset
+            elif line.strip():
+                self.offsets[json.loads(line)["Module"]] = offset
+            offset += len(line)
+
+    def __contains__(self, module):
+        return module in self.offsets
+
+    def __getitem__(self, module):
+        if self.cached[0] != module:
+            self.f.seek(self.offsets[module])
+            self.cached = (module, json.loads(self.f.readline())["Functions"])
+        return self.cached[1]
+
 def read_bb_info_json(bb_info_json):
+    with open(bb_info_json, "rb") as f:
+        head = f.readline()
+    if not head or head.startswith(BBInfoNDJSON.MODULE_PREFIX):
+        return BBInfoNDJSON(bb_info_json)
+
     with open(bb_info_json) as f:
         bb_info = json.load(f)
     return bb_info
@@ -96,79 +137,265 @@ def read_callgraph_json(directory_path):
         cg_data[bc_filename] = {}
 
         for d in module_data:
-            caller = d["CallerName"]
-            srcline = d["SourceLine"]
-
-            if not caller in cg_data[bc_filename]:
-                cg_data[bc_filename][caller]= {
-                    "FunctionCalls": {
-                        "TotalCalls": 0,
-                        "TotalIndirectCalls": 0,
-                        "TotalDirectCalls": 0,
-                        "TotalIndirectCallTargets": 0,
-                    },
-                }
-            
-            line_str = "lkf_source_line_" + str(srcline)
-            if not line_str in cg_data[bc_filename][caller]:
-                cg_data[bc_filename][caller][line_str] = {
-                    "icall": False,
-                    "dcall": False,
-                    "icallTargets": 0,
-                }
-                if d["isIndirectCall"]:
-                    cg_data[bc_filename][caller][line_str]["icall"] = True
-                    cg_data[bc_filename][caller][line_str]["icallTargets"] = 1
-                else:
-                    cg_data[bc_filename][caller][line_str]["dcall"] = True
-            else:
-                cg_data[bc_filename][caller][line_str]["icallTargets"] += 1
+            add_call_record(cg_data[bc_filename], d["CallerName"], d["SourceLine"], d["isIndirectCall"])
 
     return count_function_calls(cg_data)
 
+def add_call_record(module_data, caller, srcline, is_indirect_call):
+    if not caller in module_data:
+        module_data[caller]= {
+            "FunctionCalls": {
+                "TotalCalls": 0,
+                "TotalIndirectCalls": 0,
+                "TotalDirectCalls": 0,
+                "TotalIndirectCallTargets": 0,
+            },
+        }
+
+    line_str = "lkf_source_line_" + str(srcline)
+    if not line_str in module_data[caller]:
+        module_data[caller][line_str] = {
+            "icall": False,
+            "dcall": False,
+            "icallTargets": 0,
+        }
+        if is_indirect_call:
+            module_data[caller][line_str]["icall"] = True
+            module_data[caller][line_str]["icallTargets"] = 1
+        else:
+            module_data[caller][line_str]["dcall"] = True
+    else:
+        module_data[caller][line_str]["icallTargets"] += 1
+
+def read_callgraph_index(index_directory):
+    """Build the same cg_data as read_callgraph_json from a callgraph index (index-callgraph.py output)."""
+    cg_data = {}
+    index = CallgraphIndex.load(index_directory)
+    names = index.names
+    callers = np.asarray(index.caller).tolist()
+    lines = np.asarray(index.line).tolist()
+    indirect = np.asarray(index.indirect).tolist()
+
+    for bc_filename, start, end in index.file_ranges():
+        cg_data[bc_filename] = {}
+        for caller, srcline, is_indirect_call in zip(callers[start:end], lines[start:end], indirect[start:end]):
+            add_call_record(cg_data[bc_filename], names[caller], srcline, is_indirect_call)
+
+    return count_function_calls(cg_data)
+
+def iter_cg_data_modules(stats):
+    """Yield (bc file, cg_data entry) from CallSiteStats one module at a time, in read_callgraph_json order."""
+    names = stats.index.names
+    for bc_filename, file_id in stats.modules().items():
+        module_data = {}
+
+        start, end = stats.function_range(file_id)
+        for caller, icalls, icall_targets in zip(stats.func_caller[start:end].tolist(),
+                                                 stats.func_indirect_calls[start:end].tolist(),
+                                                 stats.func_indirect_targets[start:end].tolist()):
+            module_data[names[caller]] = {
+                "FunctionCalls": {
+                    "TotalCalls": 0,
+                    "TotalIndirectCalls": icalls,
+                    "TotalDirectCalls": 0,
+                    "TotalIndirectCallTargets": icall_targets,
+                },
+            }
+
+        start, end = stats.site_range(file_id)
+        for caller, srcline, icall, records in zip(stats.site_caller[start:end].tolist(),
+                                                   stats.site_line[start:end].tolist(),
+                                                   stats.site_indirect[start:end].tolist(),
+                                                   stats.site_records[start:end].tolist()):
+            module_data[names[caller]]["lkf_source_line_" + str(srcline)] = {
+                "icall": icall,
+                "dcall": not icall,
+                "icallTargets": records if icall else records - 1,
+            }
+
+        yield bc_filename, module_data
+
+def iter_merged_by_function(stats, bb_info, file_totals):
+    """
+    Yield (bc file, merge_data_by_function entry) from CallSiteStats one module at a time.
+    (bc file, functions, basic blocks, icalls, icall targets) of every yielded module is appended to file_totals.
+    """
+    names = stats.index.names
+
+    for bc_filename, file_id in stats.modules().items():
+        if not bc_filename in bb_info:
+            continue
+        module_bb_info = bb_info[bc_filename]
+
+        start, end = stats.function_range(file_id)
+        callers = stats.func_caller[start:end]
+        function_icalls = stats.func_indirect_calls[start:end]
+        function_icall_targets = stats.func_indirect_targets[start:end]
+        function_names = [names[caller] for caller in callers.tolist()]
+        keep = np.array([not name.startswith("lkf_source_line_") for name in function_names], dtype=bool)
+        if not keep.any():
+            continue
+
+        functions = {}
+        bbcounts = []
+        for functionName, icalls, icall_targets in zip([n for n, k in zip(function_names, keep.tolist()) if k],
+                                                       function_icalls[keep].tolist(),
+                                                       function_icall_targets[keep].tolist()):
+            bbcount = module_bb_info[functionName]["BasicBlocks"]
+            functions[functionName] = {
+                "bbcount": bbcount,
+                "FunctionCalls": {
+                    "TotalCalls": 0,
+                    "TotalIndirectCalls": icalls,
+                    "TotalDirectCalls": 0,
+                    "TotalIndirectCallTargets": icall_targets,
+                },
+            }
+            bbcounts.append(bbcount)
+
+        file_totals.append((bc_filename, len(functions), sum(bbcounts),
+                            int(function_icalls[keep].sum()), int(function_icall_targets[keep].sum())))
+        yield bc_filename, functions
+
+def merge_data_by_file_totals(file_totals):
+    """
+    Same result as merge_data_by_file from the per-module totals collected by iter_merged_by_function.
+    """
+    if not file_totals:
+        return []
+    bbcounts = np.array([t[2] for t in file_totals], dtype=np.int64)
+    icalls = np.array([t[3] for t in file_totals], dtype=np.int64)
+    icall_targets = np.array([t[4] for t in file_totals], dtype=np.int64)
+    modules = np.flatnonzero(icalls > 0)
+    order = modules[np.lexsort((-icall_targets[modules], -bbcounts[modules]))]
+
+    result = []
+    for i in order.tolist():
+        bcfile, functions, bbcount, icall, icall_target = file_totals[i]
+        result.append({
+            "BasicBlocks": bbcount,
+            "ICalls": icall,
+            "BCFile": bcfile,
+            "Functions": functions,
+            "ICallTargets": icall_target,
+        })
+    return result
+
+def merge_data_with_stats(stats, bb_info):
+    """
+    Same result as merge_data_by_file(merge_data_by_function(cg_data, bb_info)) computed from CallSiteStats.
+    Returns (merged by function data, merged by file data).
+    """
+    file_totals = []
+    merged = dict(iter_merged_by_function(stats, bb_info, file_totals))
+    return merged, merge_data_by_file_totals(file_totals)
+
+def write_json_object(f, items):
+    """Write (key, value) pairs as one JSON object, formatted like json.dump(..., indent=4), one value at a time."""
+    first = True
+    for key, value in items:
+        f.write("{\n    " if first else ",\n    ")
+        f.write(json.dumps(key) + ": " + json.dumps(value, indent=4).replace("\n", "\n    "))
+        first = False
+    f.write("{}" if first else "\n}")
+
+def write_ndjson(f, records):
+    """Write one compact JSON document per line."""
+    for record in records:
+        f.write(json.dumps(record, separators=(",", ":")))
+        f.write("\n")
+
+def write_function_csv_rows(f, modules):
+    """
+    Write the function-level CSV rows of each (bc file, functions) pair and pass the pair on,
+    so the CSV is written in the same pass as the function-level JSON.
+    """
+    f.write("File,Function,BasicBlocks,ICalls,ICallTargets\n")
+    for bcfile, functions in modules:
+        for functionName, v in functions.items():
+            calls = v["FunctionCalls"]
+            f.write(f"{bcfile},{functionName},{v['bbcount']},{calls['TotalIndirectCalls']},{calls['TotalIndirectCallTargets']}\n")
+        yield bcfile, functions
 
 def parse_options():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--bcfiles-dir", help="path to bcfiles", required=True,
+    parser.add_argument("--bcfiles-dir", help="path to bcfiles, or a callgraph index written by index-callgraph.py", required=True,
                         metavar="BCFILES_DIR")
-    parser.add_argument("--bb-info-json", help="BasicBlock information json", required=True,
+    parser.add_argument("--bb-info-json", help="BasicBlock information json (or NDJSON written by iranalyzer -ndjson)", required=True,
                         metavar="BB_INFO_JSON")  
     parser.add_argument("--output", help="Output file name", required=False,
                         metavar="OUTPUT_FILE_NAME", default="output")  
+    parser.add_argument("--engine", choices=["numpy", "dict"], default="numpy",
+                        help="Aggregate with grouped array operations (numpy) or the original nested dicts (dict)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of worker processes used to parse the callgraph json files (numpy engine)")
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json",
+                        help="Write the function and file analysis as indented JSON documents or as NDJSON (one bc file or file row per line)")
+    parser.add_argument("--cg-data-json", action="store_true", default=False,
+                        help="Also write the per-call-site debug data to cg_data.json")
     args = parser.parse_args()
     return args
 
 def main():
     args = parse_options()
-    
-    cg_data = read_callgraph_json(args.bcfiles_dir)
-    with open("cg_data.json", "w") as f:
-        json.dump(cg_data, f, indent=4)
 
     merged_by_functions_csv = "function_analysis_" + args.output + ".csv"
-    bb_info = read_bb_info_json(args.bb_info_json)
-
-    merged_by_function_data = merge_data_by_function(cg_data, bb_info)
-
-    merged_by_function_file_data = merge_data_by_file(merged_by_function_data)
-
-    merged_by_functions_csv = "function_analysis_" + args.output + ".csv"
-    merged_by_functions_json = "function_analysis_" + args.output + ".json"
+    merged_by_functions_json = "function_analysis_" + args.output + "." + args.format
     merged_by_file_csv = "file_analysis_" + args.output + ".csv"
-    merged_by_file_json = "file_analysis_" + args.output + ".json"
-
-    with open(merged_by_functions_json, "w") as f:
-        json.dump(merged_by_function_data, f, indent=4)
+    merged_by_file_json = "file_analysis_" + args.output + "." + args.format
+
+    file_totals = []
+    if args.engine == "numpy":
+        if is_callgraph_index(args.bcfiles_dir):
+            index = CallgraphIndex.load(args.bcfiles_dir)
+        else:
+            index = build_callgraph_index(args.bcfiles_dir, args.jobs)
+        stats = CallSiteStats(index)
+        if args.cg_data_json:
+            with open("cg_data.json", "w") as f:
+                write_json_object(f, iter_cg_data_modules(stats))
+
+        bb_info = read_bb_info_json(args.bb_info_json)
+        modules = iter_merged_by_function(stats, bb_info, file_totals)
+    else:
+        if is_callgraph_index(args.bcfiles_dir):
+            cg_data = read_callgraph_index(args.bcfiles_dir)
+        else:
+            cg_data = read_callgraph_json(args.bcfiles_dir)
+        if args.cg_data_json:
+            with open("cg_data.json", "w") as f:
+                json.dump(cg_data, f, indent=4)
+
+        bb_info = read_bb_info_json(args.bb_info_json)
+
+        merged_by_function_data = merge_data_by_function(cg_data, bb_info)
+        modules = merged_by_function_data.items()
+
+    # Each module is written to the function-level JSON and CSV as soon as it is aggregated
+    with open(merged_by_functions_json, "w") as f, open(merged_by_functions_csv, "w") as csv_file:
+        modules = write_function_csv_rows(csv_file, modules)
+        if args.format == "ndjson":
+            write_ndjson(f, ({"BCFile": bcfile, "Functions": functions} for bcfile, functions in modules))
+        else:
+            write_json_object(f, modules)
+
+    if args.engine == "numpy":
+        merged_by_function_file_data = merge_data_by_file_totals(file_totals)
+    else:
+        merged_by_function_file_data = merge_data_by_file(merged_by_function_data)
 
     with open(merged_by_file_json, "w") as f:
-        json.dump(merged_by_function_file_data, f, indent=4)
+        if args.format == "ndjson":
+            write_ndjson(f, merged_by_function_file_data)
+        else:
+            json.dump(merged_by_function_file_data, f, indent=4)
 
     with open(merged_by_file_csv, "w") as f:
         f.write("File,Functions,BasicBlocks,ICalls,ICallTargets\n")
         for v in merged_by_function_file_data:
             f.write(f"{v['BCFile']},{v['Functions']},{v['BasicBlocks']},{v['ICalls']},{v['ICallTargets']}\n")
-    
-    print(f"Output written to {merged_by_file_csv} and {merged_by_file_json}")
+
+    print(f"Output written to {merged_by_functions_csv}, {merged_by_functions_json}, {merged_by_file_csv} and {merged_by_file_json}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,163 @@
+"""
+Syscall reachability index for a call graph store.
+
+For every function the index lists the syscall entry points that can reach it
+and the minimum call depth from each entry. It is stored as CSR arrays keyed by
+node id of the graph store, so "which syscalls reach X" is a single slice:
+  syscalls.txt         syscall entry function names (syscall id = line number)
+  syscall_nodes.npy    int32 graph store node id of each syscall entry
+  indptr.npy           int64, len = number of graph nodes + 1
+  syscall_ids.npy      uint16 syscall id of each entry
+  depths.npy           uint16 minimum call depth of each entry
+  store.txt            node count and names.txt digest of the graph the index was built from
+
+Node ids are only valid for that graph, so check matches() before using a saved index.
+"""
+import os
+import re
+import numpy as np
+
+from graph_store import read_lines, write_lines, names_digest
+
+SYSCALL_ENTRY_PATTERN = re.compile(r'^(__x64_sys_|__do_sys_)\w+$')
+
+def find_syscall_entries(graph, pattern=SYSCALL_ENTRY_PATTERN):
+    """Return the node ids of the syscall entry functions in a GraphStore."""
+    return np.array([i for i, name in enumerate(graph.names) if pattern.match(name)], dtype=np.int32)
+
+def expand_frontier(indptr, indices, frontier):
+    """Return all successors of the frontier nodes (with duplicates) using vectorized CSR gathers."""
+    starts = np.asarray(indptr[frontier], dtype=np.int64)
+    lengths = np.asarray(indptr[frontier + 1], dtype=np.int64) - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int32)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total, dtype=np.int64)
+    return np.asarray(indices[offsets], dtype=np.int32)
+
+def bfs_depths(graph, sources):
+    """
+    Level-synchronous BFS over the forward CSR arrays from the given sources.
+    Returns (reached node ids, depths).
+    """
+    visited = np.zeros(graph.number_of_nodes(), dtype=bool)
+    frontier = np.unique(np.asarray(sources, dtype=np.int32))
+    visited[frontier] = True
+    reached = [frontier]
+    depths = [np.zeros(len(frontier), dtype=np.uint16)]
+    depth = 0
+
+    while len(frontier):
+        depth += 1
+        successors = np.unique(expand_frontier(graph.fwd_indptr, graph.fwd_indices, frontier))
+        frontier = successors[~visited[successors]]
+        visited[frontier] = True
+        reached.append(frontier)
+        depths.append(np.full(len(frontier), min(depth, np.iinfo(np.uint16).max), dtype=np.uint16))
+
+    return np.concatenate(reached), np.concatenate(depths)
+
+def reachable_mask(graph, sources):
+    """Return a boolean mask of the nodes reachable from any of the sources."""
+    mask = np.zeros(graph.number_of_nodes(), dtype=bool)
+    mask[bfs_depths(graph, sources)[0]] = True
+    return mask
+
+def build_syscall_index(graph, entries=None):
+    """
+    Run one BFS per syscall entry and return a SyscallIndex.
+    """
+    if entries is None:
+        entries = find_syscall_entries(graph)
+
+    nodes = []
+    syscall_ids = []
+    depths = []
+    for syscall_id, entry in enumerate(entries.tolist()):
+        reached, reached_depths = bfs_depths(graph, [entry])
+        nodes.append(reached)
+        syscall_ids.append(np.full(len(reached), syscall_id, dtype=np.uint16))
+        depths.append(reached_depths)
+
+    if nodes:
+        nodes = np.concatenate(nodes)
+        syscall_ids = np.concatenate(syscall_ids)
+        depths = np.concatenate(depths)
+    else:
+        nodes = np.empty(0, dtype=np.int32)
+        syscall_ids = np.empty(0, dtype=np.uint16)
+        depths = np.empty(0, dtype=np.uint16)
+
+    # Group the (node, syscall, depth) triples by node, nearest syscalls first
+    order = np.lexsort((depths, nodes))
+    indptr = np.zeros(graph.number_of_nodes() + 1, dtype=np.int64)
+    np.cumsum(np.bincount(nodes, minlength=graph.number_of_nodes()), out=indptr[1:])
+
+    return SyscallIndex([graph.name(e) for e in entries.tolist()], entries,
+                        indptr, syscall_ids[order], depths[order],
+                        graph.number_of_nodes(), names_digest(graph.names))
+
+class SyscallIndex:
+    """
+    Per-function syscall reachability lookups on graph store node ids.
+    """
+    def __init__(self, syscalls, syscall_nodes, indptr, syscall_ids, depths, num_nodes=None, digest=None):
+        self.syscalls = syscalls
+        self.syscall_nodes = syscall_nodes
+        self.indptr = indptr
+        self.syscall_ids = syscall_ids
+        self.depths = depths
+        self.num_nodes = num_nodes
+        self.digest = digest
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        write_lines(os.path.join(directory, "store.txt"), [self.num_nodes, self.digest])
+        write_lines(os.path.join(directory, "syscalls.txt"), self.syscalls)
+        np.save(os.path.join(directory, "syscall_nodes.npy"), np.asarray(self.syscall_nodes, dtype=np.int32))
+        np.save(os.path.join(directory, "indptr.npy"), self.indptr)
+        np.save(os.path.join(directory, "syscall_ids.npy"), self.syscall_ids)
+        np.save(os.path.join(directory, "depths.npy"), self.depths)
+
+    @classmethod
+    def load(cls, directory):
+        def load_array(name):
+            return np.load(os.path.join(directory, name), mmap_mode="r")
+
+        # Indexes saved without store.txt never match a graph
+        num_nodes = digest = None
+        store_file = os.path.join(directory, "store.txt")
+        if os.path.isfile(store_file):
+            store = read_lines(store_file)
+            if len(store) == 2 and store[0].isdigit():
+                num_nodes, digest = int(store[0]), store[1]
+
+        return cls(read_lines(os.path.join(directory, "syscalls.txt")), load_array("syscall_nodes.npy"),
+                   load_array("indptr.npy"), load_array("syscall_ids.npy"), load_array("depths.npy"),
+                   num_nodes, digest)
+
+    def matches(self, graph):
+        """Return True if the index was built from a graph with the same node ids as graph."""
+        return (self.num_nodes == graph.number_of_nodes() and len(self.indptr) == graph.number_of_nodes() + 1
+                and self.digest == names_digest(graph.names))
+
+    def reaching_syscalls(self, node):
+        """Return [(syscall name, minimum depth)] for a node id, nearest first."""
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return [(self.syscalls[s], int(d)) for s, d in zip(self.syscall_ids[start:end].tolist(),
+                                                           self.depths[start:end].tolist())]
+
+    def min_depth(self, node):
+        """Return the minimum depth from any syscall to a node id, or None if unreachable."""
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return int(self.depths[start]) if end > start else None
+
+    def reachable_mask(self):
+        """Return a boolean mask of the nodes reachable from at least one syscall."""
+        return np.diff(np.asarray(self.indptr)) > 0
+
+    def entry_mask(self, num_nodes):
+        """Return a boolean mask of the syscall entry nodes."""
+        mask = np.zeros(num_nodes, dtype=bool)
+        mask[np.asarray(self.syscall_nodes)] = True
+        return mask